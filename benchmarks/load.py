@@ -0,0 +1,358 @@
+"""End-to-end HTTP load test of the recommender API.
+
+Seeds a local SQLite (or any SQLAlchemy URL) database, starts `main:app` under
+uvicorn against it and drives a weighted mix of concurrent /v1/auth,
+/v1/recommend-temp and /v1/recommend-shifts requests with pre-minted JWTs,
+then reports throughput, p50/p95/p99 latency and error rates per route:
+
+    python -m benchmarks.load --size 100000 --concurrency 64 --duration 30
+    python -m benchmarks.load --mix recommend-shifts=9,auth=1 --baseline old.json
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import platform
+import random
+import secrets
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+import httpx
+import numpy as np
+from jose import jwt
+from sqlalchemy import create_engine, insert
+
+from benchmarks.recommenders import RESULTS_DIR, git_revision, seed_database
+from models import UserCredentialsDatabaseModel
+from routers.v1.crud.passwords import get_pwd_context
+
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_MIX = "recommend-shifts=6,recommend-temp=3,auth=1"
+# distinct users the pre-minted tokens belong to
+TOKEN_COUNT = 100
+LOAD_TEST_PASSWORD = "load-test-password"
+READY_TIMEOUT = 120
+
+
+# function to parse a route mix such as "recommend-shifts=6,auth=1"
+def parse_mix(mix):
+    weights = {}
+    for part in mix.split(","):
+        route, _, weight = part.partition("=")
+        if route not in REQUESTS:
+            raise argparse.ArgumentTypeError(f"unknown route {route!r}")
+        weights[route] = float(weight or 1)
+    return weights
+
+
+# function to get a free local port for the server
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+# function to seed recommender data plus the user /v1/auth logs in as
+def seed(db_url, size, allow_drop=False):
+    engine = create_engine(db_url)
+    values = seed_database(engine, size, allow_drop=allow_drop)
+    with engine.begin() as connection:
+        connection.execute(
+            insert(UserCredentialsDatabaseModel),
+            [
+                {
+                    "id": str(uuid.uuid4()),
+                    "email": "loadtest@gmail.com",
+                    "password": get_pwd_context().hash(LOAD_TEST_PASSWORD),
+                }
+            ],
+        )
+    engine.dispose()
+    return values
+
+
+# function to start uvicorn serving main:app, with config.py taken from the
+# template when the checkout has none
+def start_server(tmp_dir, port, env, workers):
+    if not os.path.exists(os.path.join(PACKAGE_DIR, "config.py")):
+        shutil.copy(
+            os.path.join(PACKAGE_DIR, "config_template.py"),
+            os.path.join(tmp_dir, "config.py"),
+        )
+    env = dict(
+        os.environ,
+        PYTHONPATH=os.pathsep.join([tmp_dir, PACKAGE_DIR]),
+        **env,
+    )
+    return subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "main:app",
+            "--host",
+            "127.0.0.1",
+            "--port",
+            str(port),
+            "--workers",
+            str(workers),
+            "--log-level",
+            "warning",
+        ],
+        cwd=PACKAGE_DIR,
+        env=env,
+    )
+
+
+# function to wait until every worker reports its indexes loaded
+async def wait_ready(client, server):
+    deadline = time.monotonic() + READY_TIMEOUT
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"server exited with {server.returncode}")
+        try:
+            if (await client.get("/ready")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.5)
+    raise RuntimeError("server did not become ready")
+
+
+# function to draw the query params of a recommend request
+def recommend_params(rng, values):
+    return {
+        "speciality": rng.choice(values["speciality"]),
+        "certificate": rng.choice(values["certification"]),
+        "city": rng.choice(values["city"]),
+        "state": rng.choice(values["state"]),
+    }
+
+
+# route name -> function sending one request of that route
+REQUESTS = {
+    "auth": lambda client, rng, values, token: client.post(
+        "/v1/auth",
+        json={"email": "loadtest@gmail.com", "password": LOAD_TEST_PASSWORD},
+    ),
+    "recommend-temp": lambda client, rng, values, token: client.get(
+        "/v1/recommend-temp",
+        params=recommend_params(rng, values),
+        headers={"authorization": token},
+    ),
+    "recommend-shifts": lambda client, rng, values, token: client.get(
+        "/v1/recommend-shifts",
+        params=recommend_params(rng, values),
+        headers={"authorization": token},
+    ),
+}
+
+
+# function to send requests from one simulated client until the deadline
+async def run_client(client, rng, mix, values, tokens, deadline, samples):
+    routes, weights = list(mix), list(mix.values())
+    while time.monotonic() < deadline:
+        route = rng.choices(routes, weights)[0]
+        started = time.perf_counter()
+        try:
+            response = await REQUESTS[route](client, rng, values, rng.choice(tokens))
+            status = response.status_code
+        except httpx.HTTPError:
+            status = None
+        samples.append((route, status, time.perf_counter() - started))
+
+
+# function to summarize the samples of one route
+def summarize(samples, seconds):
+    latencies = np.array([latency for _, _, latency in samples]) * 1000
+    statuses = {}
+    for _, status, _ in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    errors = sum(1 for _, status, _ in samples if status is None or status >= 400)
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) if len(samples) else [0] * 3
+    return {
+        "requests": len(samples),
+        "requests_per_second": len(samples) / seconds,
+        "p50_ms": float(p50),
+        "p95_ms": float(p95),
+        "p99_ms": float(p99),
+        "error_rate": errors / len(samples) if samples else 0.0,
+        "statuses": statuses,
+    }
+
+
+# function to run the warmup and then the measured phase with one simulated
+# client per unit of concurrency
+async def drive(base_url, server, mix, values, tokens, concurrency, duration, warmup):
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(
+        base_url=base_url, limits=limits, timeout=30
+    ) as client:
+        await wait_ready(client, server)
+        seed_rng = random.Random(0)
+        clients = [random.Random(seed_rng.getrandbits(64)) for _ in range(concurrency)]
+        for phase_seconds in (warmup, duration):
+            samples = []
+            deadline = time.monotonic() + phase_seconds
+            started = time.perf_counter()
+            await asyncio.gather(
+                *(
+                    run_client(client, rng, mix, values, tokens, deadline, samples)
+                    for rng in clients
+                )
+            )
+        seconds = time.perf_counter() - started
+    # only the samples of the measured phase, after the warmup
+    return {
+        route: summarize([s for s in samples if s[0] == route], seconds)
+        for route in mix
+    }
+
+
+# function to seed, serve and load the app, returning the JSON report
+def run_load_test(
+    size,
+    mix,
+    concurrency,
+    duration,
+    warmup=5,
+    workers=1,
+    db_url=None,
+    async_db_url=None,
+    allow_drop=False,
+):
+    jwt_key = secrets.token_hex(32)
+    tokens = [
+        "Bearer " + jwt.encode({"email": f"user{i}@example.com"}, jwt_key)
+        for i in range(TOKEN_COUNT)
+    ]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if db_url is None:
+            database = os.path.join(tmp_dir, "load.db")
+            db_url = f"sqlite:///{database}"
+            async_db_url = f"sqlite+aiosqlite:///{database}"
+        values = seed(db_url, size, allow_drop)
+        port = free_port()
+        env = {
+            "FA_TITLE": "Recommender system APIs",
+            "FA_JWT_KEY": json.dumps(jwt_key),
+            "FA_DB_URL": db_url,
+            "FA_ASYNC_DB_URL": async_db_url,
+            "INDEX_SNAPSHOT_DIR": os.path.join(tmp_dir, "snapshots"),
+        }
+        server = start_server(tmp_dir, port, env, workers)
+        try:
+            routes = asyncio.run(
+                drive(
+                    f"http://127.0.0.1:{port}",
+                    server,
+                    mix,
+                    values,
+                    tokens,
+                    concurrency,
+                    duration,
+                    warmup,
+                )
+            )
+        finally:
+            server.terminate()
+            server.wait(30)
+    return {
+        "revision": git_revision(),
+        "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "size": size,
+        "concurrency": concurrency,
+        "duration": duration,
+        "workers": workers,
+        "mix": mix,
+        "routes": routes,
+    }
+
+
+# function to print each route's numbers next to those of a baseline run
+def compare(report, baseline):
+    for route, result in report["routes"].items():
+        before = baseline.get("routes", {}).get(route)
+        if before is None:
+            continue
+        for metric in ("requests_per_second", "p50_ms", "p95_ms", "p99_ms"):
+            ratio = result[metric] / before[metric] if before[metric] else float("nan")
+            print(
+                f"{route:<18} {metric:<20} {before[metric]:>10.2f} -> "
+                f"{result[metric]:>10.2f} ({ratio:.2f}x)"
+            )
+        print(
+            f"{route:<18} {'error_rate':<20} {before['error_rate']:>10.2%} -> "
+            f"{result['error_rate']:>10.2%}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=10000, help="rows per table")
+    parser.add_argument(
+        "--mix",
+        type=parse_mix,
+        default=DEFAULT_MIX,
+        help=f"weighted routes, default {DEFAULT_MIX}",
+    )
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=30, help="seconds")
+    parser.add_argument("--warmup", type=float, default=5, help="seconds")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers")
+    parser.add_argument(
+        "--db-url", help="SQLAlchemy URL to seed, defaults to a temporary SQLite file"
+    )
+    parser.add_argument("--async-db-url", help="async URL of the same database")
+    parser.add_argument(
+        "--allow-drop",
+        action="store_true",
+        help="let --db-url point at a non-SQLite database whose tables are dropped",
+    )
+    parser.add_argument("--output", help="path of the JSON report")
+    parser.add_argument("--baseline", help="JSON report to compare against")
+    args = parser.parse_args()
+    if args.db_url and not args.async_db_url:
+        parser.error("--db-url needs --async-db-url")
+
+    report = run_load_test(
+        args.size,
+        args.mix,
+        args.concurrency,
+        args.duration,
+        warmup=args.warmup,
+        workers=args.workers,
+        db_url=args.db_url,
+        async_db_url=args.async_db_url,
+        allow_drop=args.allow_drop,
+    )
+    for route, result in report["routes"].items():
+        print(
+            f"{route:<18} {result['requests_per_second']:>8.1f} req/s "
+            f"p50 {result['p50_ms']:.1f}ms p95 {result['p95_ms']:.1f}ms "
+            f"p99 {result['p99_ms']:.1f}ms errors {result['error_rate']:.2%}"
+        )
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"load-{report['revision'] or 'local'}.json"
+    )
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {output}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
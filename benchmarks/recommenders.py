@@ -0,0 +1,305 @@
+"""Synthetic-data benchmarks for the temp and shift recommender engines.
+
+Generates csv_data, badges and shifts_table rows into a local SQLite (or any
+SQLAlchemy URL, e.g. a local Postgres) database, then times every stage of the
+recommenders separately and writes the results as JSON:
+
+    python -m benchmarks.recommenders --sizes 10000 100000 1000000
+    python -m benchmarks.recommenders --sizes 10000 --baseline benchmarks/results/old.json
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import subprocess
+import tempfile
+import time
+import tracemalloc
+import uuid
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import Session
+
+from models import Badge, Base, ShiftData, TempData
+from routers.v1.crud import helper
+from routers.v1.crud.materialized import build_temp_recommendations
+from routers.v1.crud.shift_index import SHIFT_COLUMNS, build_shift_index
+from routers.v1.crud.temp_store import build_temp_store
+
+RESULTS_DIR = os.path.join("benchmarks", "results")
+INSERT_CHUNK_SIZE = 10000
+QUERY_COUNT = 1000
+
+BADGES = {
+    "Health Care supporter": (20, 20),
+    "Care Specialist": (40, 40),
+    "Patient Advocate": (60, 60),
+    "Clinical Excellence": (80, 80),
+    "Elite Care Partner": (95, 95),
+}
+# attribute cardinalities of the synthetic shifts
+CARDINALITIES = {"city": 500, "state": 50, "speciality": 40, "certification": 30}
+
+
+# function to insert rows in chunks without building ORM objects
+def bulk_insert(connection, model, rows):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == INSERT_CHUNK_SIZE:
+            connection.execute(insert(model), chunk)
+            chunk = []
+    if chunk:
+        connection.execute(insert(model), chunk)
+
+
+# function to generate synthetic temps, badges and shifts; every table of the
+# models is dropped first, so databases other than SQLite need allow_drop
+def seed_database(engine, size, seed=0, allow_drop=False):
+    if engine.dialect.name != "sqlite" and not allow_drop:
+        raise ValueError(
+            f"Refusing to drop the tables of a {engine.dialect.name} database, "
+            "pass --allow-drop to seed it anyway"
+        )
+    rng = random.Random(seed)
+    values = {
+        column: [str(uuid.UUID(int=rng.getrandbits(128))) for _ in range(count)]
+        for column, count in CARDINALITIES.items()
+    }
+    today = datetime.date.today()
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        bulk_insert(
+            connection,
+            Badge,
+            (
+                {
+                    "id": str(uuid.uuid4()),
+                    "badge_name": name,
+                    "attendance_score_threshold": attendance,
+                    "on_time_threshold": on_time,
+                    "show_up_rate": 0,
+                }
+                for name, (attendance, on_time) in BADGES.items()
+            ),
+        )
+        bulk_insert(
+            connection,
+            TempData,
+            (
+                {
+                    "tempid": str(uuid.UUID(int=rng.getrandbits(128))),
+                    "total_shift": 100,
+                    "shift_attended": rng.randint(0, 100),
+                    "attendance_score": rng.randint(0, 100),
+                    "on_time_checkin": rng.randint(0, 100),
+                    "on_time_rate": rng.randint(0, 100),
+                }
+                for _ in range(size)
+            ),
+        )
+        bulk_insert(
+            connection,
+            ShiftData,
+            (
+                {
+                    "id": str(uuid.UUID(int=rng.getrandbits(128))),
+                    "city": rng.choice(values["city"]),
+                    "state": rng.choice(values["state"]),
+                    "overall_rating": str(rng.randint(1, 5)),
+                    "speciality": rng.choice(values["speciality"]),
+                    "certification": rng.choice(values["certification"]),
+                    "date": today + datetime.timedelta(days=rng.randint(-180, 60)),
+                    "is_long_term": rng.random() < 0.2,
+                }
+                for _ in range(size)
+            ),
+        )
+    return values
+
+
+# function to run a stage, returning its result, wall time and peak memory
+def measure(stage, measure_memory):
+    started = time.perf_counter()
+    result = stage()
+    seconds = time.perf_counter() - started
+    peak_mb = None
+    if measure_memory:
+        # separate traced run, so tracing overhead does not skew the timing
+        tracemalloc.start()
+        stage()
+        peak_mb = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+    return result, {"seconds": seconds, "peak_mb": peak_mb}
+
+
+# function to time each temp recommender stage
+def bench_temp_recommender(db, size, measure_memory):
+    stages = {}
+    columns, stages["fetch"] = measure(
+        lambda: helper.fetch_temps_columns(db), measure_memory
+    )
+    temp_store, stages["scale"] = measure(
+        lambda: build_temp_store(columns), measure_memory
+    )
+    badges = [
+        (badge.badge_name, badge.attendance_score_threshold, badge.on_time_threshold)
+        for badge in helper.fetch_badge_data_from_db(db)
+    ]
+    recommendations, stages["score"] = measure(
+        lambda: build_temp_recommendations((temp_store, badges)), measure_memory
+    )
+    payload = {
+        "data": {
+            "temps": recommendations.temps,
+            "computed_at": recommendations.computed_at.isoformat(),
+        }
+    }
+    _, stages["serialize"] = measure(lambda: json.dumps(payload), measure_memory)
+    stages["fetch"]["rows_per_second"] = size / stages["fetch"]["seconds"]
+    stages["scale"]["rows_per_second"] = size / stages["scale"]["seconds"]
+    return stages
+
+
+# function to time each shift recommender stage
+def bench_shift_recommender(db, size, values, measure_memory, seed=0):
+    rng = random.Random(seed)
+    queries = [
+        tuple(rng.choice(values[column]) for column in SHIFT_COLUMNS)
+        for _ in range(QUERY_COUNT)
+    ]
+    stages = {}
+    columns, stages["fetch"] = measure(
+        lambda: helper.fetch_shift_columns(db), measure_memory
+    )
+    shift_index, stages["vectorize"] = measure(
+        lambda: build_shift_index(columns), measure_memory
+    )
+    results, stages["score"] = measure(
+        lambda: [shift_index.search(query, k=5) for query in queries],
+        measure_memory,
+    )
+    _, stages["score_batch"] = measure(
+        lambda: shift_index.search_batch(queries, k=5), measure_memory
+    )
+    payloads = [{"data": {"shift": shift_index.ids[rows].tolist()}} for rows in results]
+    _, stages["serialize"] = measure(
+        lambda: [json.dumps(payload) for payload in payloads], measure_memory
+    )
+    stages["fetch"]["rows_per_second"] = size / stages["fetch"]["seconds"]
+    stages["vectorize"]["rows_per_second"] = size / stages["vectorize"]["seconds"]
+    for stage in ("score", "score_batch", "serialize"):
+        stages[stage]["queries_per_second"] = QUERY_COUNT / stages[stage]["seconds"]
+    return stages
+
+
+# function to get the current commit, so results can be compared across versions
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# function to seed and benchmark every size
+def run_benchmarks(sizes, db_url=None, measure_memory=True, allow_drop=False):
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        url = db_url or f"sqlite:///{os.path.join(tmp_dir, 'benchmark.db')}"
+        engine = create_engine(url)
+        for size in sizes:
+            started = time.perf_counter()
+            values = seed_database(engine, size, allow_drop=allow_drop)
+            seed_seconds = time.perf_counter() - started
+            with Session(engine) as db:
+                results.append(
+                    {
+                        "size": size,
+                        "seed_seconds": seed_seconds,
+                        "temp_recommender": bench_temp_recommender(
+                            db, size, measure_memory
+                        ),
+                        "shift_recommender": bench_shift_recommender(
+                            db, size, values, measure_memory
+                        ),
+                    }
+                )
+        engine.dispose()
+    return {
+        "revision": git_revision(),
+        "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "database": engine.dialect.name,
+        "results": results,
+    }
+
+
+# function to print each stage time next to the same stage of a baseline run
+def compare(report, baseline):
+    baseline_results = {result["size"]: result for result in baseline["results"]}
+    for result in report["results"]:
+        previous = baseline_results.get(result["size"])
+        if previous is None:
+            continue
+        for engine in ("temp_recommender", "shift_recommender"):
+            for stage, timing in result[engine].items():
+                before = previous.get(engine, {}).get(stage)
+                if before is None:
+                    continue
+                ratio = timing["seconds"] / before["seconds"]
+                print(
+                    f"{result['size']:>9} {engine:<18} {stage:<12} "
+                    f"{before['seconds']:.4f}s -> {timing['seconds']:.4f}s "
+                    f"({ratio:.2f}x)"
+                )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[10000, 100000, 1000000]
+    )
+    parser.add_argument(
+        "--db-url", help="SQLAlchemy URL to seed, defaults to a temporary SQLite file"
+    )
+    parser.add_argument(
+        "--allow-drop",
+        action="store_true",
+        help="let --db-url point at a non-SQLite database whose tables are dropped",
+    )
+    parser.add_argument("--output", help="path of the JSON report")
+    parser.add_argument("--baseline", help="JSON report to compare against")
+    parser.add_argument(
+        "--no-memory", action="store_true", help="skip the traced memory runs"
+    )
+    args = parser.parse_args()
+
+    report = run_benchmarks(
+        args.sizes,
+        db_url=args.db_url,
+        measure_memory=not args.no_memory,
+        allow_drop=args.allow_drop,
+    )
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"recommenders-{report['revision'] or 'local'}.json"
+    )
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {output}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""Scaling benchmark for sharded batch shift scoring.
+
+Builds a synthetic shift index in memory, then times the same batch of queries
+scored in-process and scattered across 2, 4, ... shard processes, reporting
+throughput and speedup over the in-process run as JSON:
+
+    python -m benchmarks.sharding --size 1000000 --shards 1 2 4 8
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import time
+import uuid
+
+import numpy as np
+
+from benchmarks.recommenders import CARDINALITIES, RESULTS_DIR, git_revision
+from routers.v1.crud.sharded import ShardedShiftScorer
+from routers.v1.crud.shift_index import SHIFT_COLUMNS, build_shift_index
+
+BATCH_SIZE = 1000
+
+
+# function to generate the columns of synthetic upcoming shifts
+def make_shift_columns(size, seed=0):
+    rng = random.Random(seed)
+    values = {
+        column: [str(uuid.UUID(int=rng.getrandbits(128))) for _ in range(count)]
+        for column, count in CARDINALITIES.items()
+    }
+    today = datetime.date.today()
+    columns = {"id": [str(uuid.UUID(int=rng.getrandbits(128))) for _ in range(size)]}
+    for column in SHIFT_COLUMNS:
+        columns[column] = [rng.choice(values[column]) for _ in range(size)]
+    columns["date"] = [
+        today + datetime.timedelta(days=rng.randint(0, 60)) for _ in range(size)
+    ]
+    columns["is_long_term"] = [rng.random() < 0.2 for _ in range(size)]
+    return columns, values
+
+
+# function to time batches scored in-process (1 shard) or by a sharded scorer
+def bench_shards(shift_index, queries, shards, repeats):
+    scorer = ShardedShiftScorer(shards) if shards > 1 else None
+    try:
+        if scorer is not None:
+            # share the shards and start the workers outside the timing
+            scorer.search_batch(shift_index, queries[:1])
+        timings = []
+        for _ in range(repeats):
+            started = time.perf_counter()
+            if scorer is None:
+                results = shift_index.search_batch(queries, k=5)
+            else:
+                results = scorer.search_batch(shift_index, queries, k=5)
+            timings.append(time.perf_counter() - started)
+    finally:
+        if scorer is not None:
+            scorer.shutdown()
+    seconds = min(timings)
+    return results, {"seconds": seconds, "queries_per_second": len(queries) / seconds}
+
+
+# function to time every shard count on one synthetic index
+def run_benchmark(size, shard_counts, batch_size=BATCH_SIZE, repeats=3, seed=0):
+    columns, values = make_shift_columns(size, seed)
+    shift_index = build_shift_index(columns)
+    rng = random.Random(seed)
+    queries = [
+        tuple(rng.choice(values[column]) for column in SHIFT_COLUMNS)
+        for _ in range(batch_size)
+    ]
+    results = {}
+    baseline = None
+    for shards in shard_counts:
+        rows, timing = bench_shards(shift_index, queries, shards, repeats)
+        if baseline is None:
+            baseline = (rows, timing["seconds"])
+        timing["speedup"] = baseline[1] / timing["seconds"]
+        # every shard count must produce the in-process ranking
+        timing["matches"] = all(np.array_equal(a, b) for a, b in zip(rows, baseline[0]))
+        results[shards] = timing
+        print(
+            f"{shards:>3} shards {timing['queries_per_second']:>10.0f} queries/s "
+            f"{timing['speedup']:.2f}x matches={timing['matches']}"
+        )
+    return {
+        "revision": git_revision(),
+        "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "size": size,
+        "batch_size": batch_size,
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=1000000)
+    parser.add_argument(
+        "--shards",
+        type=int,
+        nargs="+",
+        default=sorted({1, 2, 4, os.cpu_count() or 1}),
+        help="shard counts to time, 1 meaning in-process",
+    )
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--output", help="path of the JSON report")
+    args = parser.parse_args()
+
+    report = run_benchmark(args.size, args.shards, batch_size=args.batch_size)
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"sharding-{report['revision'] or 'local'}.json"
+    )
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {output}")
+
+
+if __name__ == "__main__":
+    main()
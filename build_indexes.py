@@ -0,0 +1,156 @@
+"""Offline build of the recommender index snapshot loaded by the API workers.
+
+Reads csv_data, badges and shifts_table, builds the temp feature store, the
+materialized badge rankings and the shift index, writes them into a new
+versioned directory under INDEX_SNAPSHOT_DIR, verifies the written files
+against the freshly built indexes and only then publishes the directory:
+
+    python -m build_indexes
+    python -m build_indexes --output /srv/snapshots --keep 5
+"""
+
+import argparse
+import os
+import shutil
+
+import numpy as np
+
+from routers.v1.crud import snapshots
+from routers.v1.crud.materialized import temp_recommendation_holder
+from routers.v1.crud.shift_index import SHIFT_COLUMNS, shift_index_holder
+from routers.v1.crud.temp_store import temp_store_holder
+
+# in dependency order: the badge rankings are computed from the temp store
+HOLDERS = [temp_store_holder, temp_recommendation_holder, shift_index_holder]
+VERIFY_SAMPLE_SIZE = 100
+
+
+class SnapshotVerificationError(Exception):
+    pass
+
+
+def _check(condition, message):
+    if not condition:
+        raise SnapshotVerificationError(message)
+
+
+def _same_sparse(a, b):
+    return a.shape == b.shape and (a != b).nnz == 0
+
+
+def verify_temp_store(loaded, built):
+    _check(np.array_equal(loaded.tempids, built.tempids), "temp ids differ")
+    _check(np.array_equal(loaded.matrix, built.matrix), "temp matrix differs")
+    _check(
+        np.array_equal(loaded.scaler.min_, built.scaler.min_)
+        and np.array_equal(loaded.scaler.scale_, built.scaler.scale_),
+        "temp scaler differs",
+    )
+
+
+def verify_temp_recommendations(loaded, built):
+    _check(loaded.temps == built.temps, "badge rankings differ")
+    _check(loaded.computed_at == built.computed_at, "computed_at differs")
+    _check(loaded.version == built.version, "cursor version differs")
+
+
+def verify_shift_index(loaded, built):
+    _check(np.array_equal(loaded.ids, built.ids), "shift ids differ")
+    _check(
+        np.array_equal(loaded.dates, built.dates, equal_nan=True)
+        and np.array_equal(loaded.long_term, built.long_term),
+        "shift dates differ",
+    )
+    _check(_same_sparse(loaded.matrix, built.matrix), "shift matrix differs")
+    _check(_same_sparse(loaded.postings, built.postings), "shift postings differ")
+    if built.vectorizer is None:
+        return
+    # a sample of shifts must be found the same way by their own attributes
+    tokens = {
+        position: token for token, position in built.vectorizer.vocabulary_.items()
+    }
+    for row in range(min(len(built), VERIFY_SAMPLE_SIZE)):
+        values = dict(
+            tokens[column].split("=", 1) for column in built.matrix[row].indices
+        )
+        query = [values.get(column) for column in SHIFT_COLUMNS]
+        _check(
+            loaded.search(query).tolist() == built.search(query).tolist(),
+            f"shift search differs for row {row}",
+        )
+
+
+VERIFIERS = {
+    temp_store_holder: verify_temp_store,
+    temp_recommendation_holder: verify_temp_recommendations,
+    shift_index_holder: verify_shift_index,
+}
+
+
+# function to reopen every index from a snapshot directory and compare it with
+# the index it was written from
+def verify_snapshot(path, holders):
+    manifest = snapshots.read_manifest(path)
+    for holder in holders:
+        version, built = holder.current
+        loaded_version, loaded = holder.open_snapshot(path)
+        _check(loaded_version == version, f"{holder.name} version differs")
+        _check(
+            manifest["indexes"].get(holder.name) == version,
+            f"{holder.name} manifest version differs",
+        )
+        VERIFIERS[holder](loaded, built)
+
+
+# function to build every index from the database and publish it as the newest
+# snapshot; the directory is renamed into place only after it verified
+def build_snapshot(session_factory, holders, root, keep):
+    db = session_factory()
+    try:
+        for holder in holders:
+            holder.refresh(db, force=True)
+    finally:
+        db.close()
+
+    name = snapshots.new_snapshot_name()
+    staging = os.path.join(root, f".{name}.tmp")
+    try:
+        for holder in holders:
+            holder.save_snapshot(staging)
+        snapshots.write_manifest(
+            staging, name, {holder.name: holder.version for holder in holders}
+        )
+        verify_snapshot(staging, holders)
+        path = os.path.join(root, name)
+        os.replace(staging, path)
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+    snapshots.prune_snapshots(root, keep)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--output",
+        default=snapshots.INDEX_SNAPSHOT_DIR,
+        help="snapshot root directory, defaults to INDEX_SNAPSHOT_DIR",
+    )
+    parser.add_argument(
+        "--keep", type=int, default=3, help="number of snapshots to keep"
+    )
+    args = parser.parse_args()
+    if args.keep < 1:
+        parser.error("--keep must be at least 1")
+
+    from database import SessionLocal
+
+    path = build_snapshot(SessionLocal, HOLDERS, args.output, args.keep)
+    manifest = snapshots.read_manifest(path)
+    print(f"Snapshot {manifest['snapshot']} written to {path}")
+    for name, version in manifest["indexes"].items():
+        print(f"  {name}: version {version}")
+
+
+if __name__ == "__main__":
+    main()
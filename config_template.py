@@ -1,8 +1,6 @@
 import json
 import os
 
-from fastapi import HTTPException, status
-
 DB_HOST = os.environ.get("FA_DB_HOST")
 DB_USER = os.environ.get("FA_DB_USER")
 DB_PASSWORD = os.environ.get("FA_DB_PASSWORD")
@@ -11,14 +9,19 @@ JWT_KEY = os.environ.get("FA_JWT_KEY")
 TITLE = os.environ.get("FA_TITLE")
 DESCRIPTION = os.environ.get("FA_DESCRIPTION")
 
+# problems are recorded rather than raised, so importing the app (tests,
+# CLIs, workers) never fails here; check_config() reports them at startup
+JWT_KEY_ERROR = None
 if JWT_KEY:
     try:
         JWT_KEY = json.loads(JWT_KEY)
-    except ValueError as e:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid JWT key"
-        )
+    except ValueError:
+        JWT_KEY_ERROR = "Invalid JWT key"
 else:
-    raise HTTPException(
-        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="JWT key not set"
-    )
+    JWT_KEY_ERROR = "JWT key not set"
+
+
+# function to fail worker startup on missing or invalid settings
+def check_config():
+    if JWT_KEY_ERROR:
+        raise RuntimeError(JWT_KEY_ERROR)
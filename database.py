@@ -1,6 +1,7 @@
 import os
 
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
@@ -10,11 +11,36 @@ DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "100"))
 WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "2"))
 POOL_SIZE = max(DB_POOL_SIZE // WEB_CONCURRENCY, 5)
 
-SQLALCHEMY_DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}/{DB_NAME}"
+# FA_DB_URL / FA_ASYNC_DB_URL override the Postgres URLs, e.g. with
+# sqlite:///local.db and sqlite+aiosqlite:///local.db for local runs
+SQLALCHEMY_DATABASE_URL = os.getenv(
+    "FA_DB_URL", f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}/{DB_NAME}"
+)
+ASYNC_SQLALCHEMY_DATABASE_URL = os.getenv(
+    "FA_ASYNC_DB_URL",
+    f"postgresql+asyncpg://{DB_USER}:{DB_PASSWORD}@{DB_HOST}/{DB_NAME}",
+)
+
+
+# function to get pool settings, which SQLite's default pools do not accept
+def engine_options(url):
+    if url.startswith("sqlite"):
+        return {}
+    return {"pool_size": POOL_SIZE, "max_overflow": 0, "pool_recycle": 3600}
 
+
+# sync engine, used by the background index refresher
 engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, pool_size=POOL_SIZE, max_overflow=0, pool_recycle=3600
+    SQLALCHEMY_DATABASE_URL, **engine_options(SQLALCHEMY_DATABASE_URL)
 )
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# async engine, used by the request path
+async_engine = create_async_engine(
+    ASYNC_SQLALCHEMY_DATABASE_URL, **engine_options(ASYNC_SQLALCHEMY_DATABASE_URL)
+)
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, autoflush=False, expire_on_commit=False
+)
+
 Base = declarative_base()
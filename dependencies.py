@@ -1,10 +1,23 @@
-from database import SessionLocal
+import os
 
+from database import POOL_SIZE, AsyncSessionLocal
+from routers.v1.crud.admission import AdmissionController
 
-# Dependency
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+# requests of all routes holding a connection of the async pool at a time
+ADMISSION_LIMIT = int(os.getenv("ADMISSION_LIMIT", str(POOL_SIZE)))
+
+# one budget shared by every route, so together they never check out more
+# connections than the pool holds
+db_admission = AdmissionController("async", ADMISSION_LIMIT)
+
+
+# function to get a session dependency whose connection checkouts go through
+# the shared admission control, which sheds them with a 503 once its queue is
+# full; route labels the admission metrics
+def admitted_db(route):
+    async def get_admitted_db():
+        async with AsyncSessionLocal() as db:
+            db.info["admission"] = (db_admission, route)
+            yield db
+
+    return get_admitted_db
@@ -1,29 +1,75 @@
+import atexit
 import logging
 import os
+import queue
+import random
+import threading
 from datetime import date
-from logging.handlers import TimedRotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener, TimedRotatingFileHandler
 
 LOGS_DIR = "logs"
 os.makedirs(LOGS_DIR, exist_ok=True)
 
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# fraction of recommendation payload log lines that are actually written
+LOG_PAYLOAD_SAMPLE_RATE = float(os.getenv("LOG_PAYLOAD_SAMPLE_RATE", "1.0"))
+
+_listener = None
+_setup_lock = threading.Lock()
+
+
+# Queue handler that hands records over unformatted, so message formatting
+# happens on the listener thread, and drops records when the queue is full
+class BackgroundQueueHandler(QueueHandler):
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
 
 def setup_logging():
-    # Create a timed rotating file handler
-    current_date = date.today().strftime("%Y-%m-%d")
-    log_file_pattern = os.path.join(LOGS_DIR, f"fastapi_app_{current_date}.log")
-    file_handler = TimedRotatingFileHandler(
-        log_file_pattern, when="midnight", interval=1, backupCount=0
-    )
-
-    # Set the logging level and format
-    file_formatter = logging.Formatter(
-        "%(asctime)s - %(name)s - %(levelname)s - %(pathname)s - %(funcName)s - %(lineno)d - %(message)s"
-    )
-    file_handler.setFormatter(file_formatter)
-
-    # Create a logger and add the file handler
+    global _listener
     logger = logging.getLogger(__name__)
-    logger.addHandler(file_handler)
-    logger.setLevel(logging.DEBUG)
+    with _setup_lock:
+        # every module calls this; only the first call installs handlers
+        if _listener is not None:
+            return logger
+
+        # Create a timed rotating file handler
+        current_date = date.today().strftime("%Y-%m-%d")
+        log_file_pattern = os.path.join(LOGS_DIR, f"fastapi_app_{current_date}.log")
+        file_handler = TimedRotatingFileHandler(
+            log_file_pattern, when="midnight", interval=1, backupCount=0
+        )
+
+        # Set the logging level and format
+        file_formatter = logging.Formatter(
+            "%(asctime)s - %(name)s - %(levelname)s - %(pathname)s - %(funcName)s - %(lineno)d - %(message)s"
+        )
+        file_handler.setFormatter(file_formatter)
+
+        # Requests only enqueue records; a listener thread writes them to disk
+        log_queue = queue.Queue(LOG_QUEUE_SIZE)
+        logger.addHandler(BackgroundQueueHandler(log_queue))
+        logger.setLevel(logging.DEBUG)
+        _listener = QueueListener(log_queue, file_handler)
+        _listener.start()
+        atexit.register(_listener.stop)
 
     return logger
+
+
+# function to log a recommendation payload for a sampled fraction of requests
+def log_payload(logger, msg, *args):
+    if LOG_PAYLOAD_SAMPLE_RATE <= 0 or not logger.isEnabledFor(logging.INFO):
+        return
+    if LOG_PAYLOAD_SAMPLE_RATE >= 1 or random.random() < LOG_PAYLOAD_SAMPLE_RATE:
+        logger.info(msg, *args, stacklevel=2)
@@ -1,14 +1,84 @@
+import importlib
+import os
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 
 import config
+import metrics
+from database import SessionLocal, async_engine, engine
 from routers.v1 import api as v1
+from routers.v1.crud.authentication import password_verifier
+from routers.v1.crud.indexing import BackgroundRefresher, load_snapshots
+from routers.v1.crud.materialized import temp_recommendation_holder
+from routers.v1.crud.segments import temp_segment_holder
+from routers.v1.crud.sharded import shift_scorer
+from routers.v1.crud.shift_index import shift_index_holder
+from routers.v1.crud.snapshots import INDEX_SNAPSHOT_DIR, latest_snapshot, read_manifest
+from routers.v1.crud.temp_store import temp_store_holder
+
+metrics.register_pool("sync", engine.pool)
+metrics.register_pool("async", async_engine.sync_engine.pool)
+
+INDEX_HOLDERS = [temp_store_holder, temp_recommendation_holder, shift_index_holder]
+# segments are regrouped by the refresher but not snapshotted; their rankings
+# are computed per segment on first use
+REFRESHED_HOLDERS = INDEX_HOLDERS + [temp_segment_holder]
+
+# the recommender modules import these on first use; with WARMUP_IMPORTS on
+# (the default) they are imported during startup instead of by a request
+WARMUP_IMPORTS = os.getenv("WARMUP_IMPORTS", "1") == "1"
+DEFERRED_IMPORTS = [
+    "pandas",
+    "scipy.sparse",
+    "sklearn.feature_extraction.text",
+    "sklearn.metrics.pairwise",
+    "sklearn.neighbors",
+    "sklearn.preprocessing",
+]
+
+
+# function to fail startup on invalid settings; config.py files copied from
+# older templates have no check_config and validate JWT_KEY on import instead
+def check_config():
+    if hasattr(config, "check_config"):
+        config.check_config()
+    elif not getattr(config, "JWT_KEY", None):
+        raise RuntimeError("JWT key not set")
+
+
+# keeps the shared recommender indexes fresh for the lifetime of the worker
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    check_config()
+    if WARMUP_IMPORTS:
+        for module in DEFERRED_IMPORTS:
+            importlib.import_module(module)
+    # the newest prebuilt snapshot is memory-mapped before the worker starts
+    # serving, so all workers share one copy and none starts cold
+    app.state.snapshot = None
+    snapshot = latest_snapshot(INDEX_SNAPSHOT_DIR)
+    if snapshot is not None and load_snapshots(INDEX_HOLDERS, snapshot):
+        app.state.snapshot = read_manifest(snapshot)["snapshot"]
+    refresher = BackgroundRefresher(
+        SessionLocal, REFRESHED_HOLDERS, snapshot_root=INDEX_SNAPSHOT_DIR
+    )
+    refresher.start()
+    yield
+    refresher.stop()
+    password_verifier.shutdown()
+    if shift_scorer is not None:
+        shift_scorer.shutdown()
+
 
 app = FastAPI(
     title=config.TITLE,
     description=config.DESCRIPTION,
     version="1.0.0",
     redoc_url=None,
+    lifespan=lifespan,
 )
 origins = ["*"]
 app.add_middleware(
@@ -18,5 +88,31 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(metrics.MetricsMiddleware)
+
+
+# Prometheus scrape endpoint
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    return PlainTextResponse(
+        metrics.registry.render(), media_type="text/plain; version=0.0.4"
+    )
+
+
+# readiness probe: ready once every recommender index is in memory, whether
+# loaded from the snapshot or built by the refresher
+@app.get("/ready", include_in_schema=False)
+def get_readiness():
+    indexes = {holder.name: holder.version for holder in INDEX_HOLDERS}
+    ready = all(version is not None for version in indexes.values())
+    return JSONResponse(
+        {
+            "ready": ready,
+            "snapshot": getattr(app.state, "snapshot", None),
+            "indexes": indexes,
+        },
+        status_code=200 if ready else 503,
+    )
+
 
 app.include_router(v1.router)
@@ -0,0 +1,316 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from starlette.datastructures import MutableHeaders
+
+DEFAULT_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+# Base class of the in-process metrics rendered by /metrics
+class Metric:
+    type_name = "untyped"
+
+    def __init__(self, name, documentation, label_names=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple((name, labels[name]) for name in self.label_names)
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_name}",
+        ]
+        for name, labels, value in self.samples():
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    type_name = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    # used by scrape-time collectors that mirror counters kept elsewhere
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield self.name, key, value
+
+
+class Gauge(Counter):
+    type_name = "gauge"
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    type_name = "histogram"
+
+    def __init__(self, name, documentation, label_names=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def samples(self):
+        with self._lock:
+            items = [(key, (list(s[0]), s[1], s[2])) for key, s in self._values.items()]
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket", key + (("le", bound),), cumulative
+            yield f"{self.name}_bucket", key + (("le", "+Inf"),), count
+            yield f"{self.name}_sum", key, total
+            yield f"{self.name}_count", key, count
+
+
+# Collection of metrics plus callbacks that update them at scrape time
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    # function to render all metrics in the Prometheus text exposition format
+    def render(self):
+        for collector in self.collectors:
+            collector()
+        return "\n".join(metric.render() for metric in self.metrics) + "\n"
+
+
+registry = Registry()
+
+REQUEST_SECONDS = registry.register(
+    Histogram(
+        "http_request_duration_seconds",
+        "Request latency by route and status.",
+        ["route", "status"],
+    )
+)
+REQUESTS_IN_FLIGHT = registry.register(
+    Gauge("http_requests_in_flight", "Requests currently being served.")
+)
+STAGE_SECONDS = registry.register(
+    Histogram(
+        "recommender_stage_duration_seconds",
+        "Latency of each hot-path stage.",
+        ["stage"],
+    )
+)
+INDEX_LOOKUPS = registry.register(
+    Counter(
+        "recommender_index_lookups_total",
+        "Index lookups served from memory (hit) or by building the index (build).",
+        ["index", "result"],
+    )
+)
+SINGLE_FLIGHT_CALLS = registry.register(
+    Counter(
+        "recommender_single_flight_calls_total",
+        "Calls that ran a computation (leader), joined an in-flight one "
+        "(follower) or gave up waiting on it (timeout).",
+        ["flight", "role"],
+    )
+)
+ADMISSION_WAIT_SECONDS = registry.register(
+    Histogram(
+        "admission_wait_seconds",
+        "Time requests queued for a database slot, by route.",
+        ["route"],
+    )
+)
+ADMISSION_REJECTED = registry.register(
+    Counter(
+        "admission_rejected_total",
+        "Requests shed with a 503 because the wait queue for a database slot "
+        "was full (queue_full) or their wait ran out (timeout), by route.",
+        ["route", "reason"],
+    )
+)
+ADMISSION_ACTIVE = registry.register(
+    Gauge("admission_active", "Requests holding a database slot, by pool.", ["pool"])
+)
+ADMISSION_QUEUED = registry.register(
+    Gauge("admission_queued", "Requests waiting for a database slot.", ["pool"])
+)
+
+CACHE_HITS = registry.register(
+    Counter("cache_hits_total", "Cache hits by cache.", ["cache"])
+)
+CACHE_MISSES = registry.register(
+    Counter("cache_misses_total", "Cache misses by cache.", ["cache"])
+)
+CACHE_ENTRIES = registry.register(
+    Gauge("cache_entries", "Entries currently cached.", ["cache"])
+)
+DB_POOL_CHECKED_OUT = registry.register(
+    Gauge("db_pool_checked_out", "Connections checked out by pool.", ["pool"])
+)
+DB_POOL_SIZE = registry.register(
+    Gauge("db_pool_size", "Configured size by pool.", ["pool"])
+)
+
+_request_timings = ContextVar("request_timings", default=None)
+
+
+# Per-request stage durations used for the Server-Timing header
+class RequestTimings:
+    def __init__(self):
+        self.stages = {}
+        self.last_stage_end = None
+
+    def add(self, name, seconds):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+        self.last_stage_end = time.perf_counter()
+
+    def server_timing(self):
+        return ", ".join(
+            f"{name};dur={seconds * 1000:.3f}" for name, seconds in self.stages.items()
+        )
+
+
+# context manager to time a hot-path stage into the histogram and the
+# current request's Server-Timing header
+@contextmanager
+def stage(name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        STAGE_SECONDS.observe(seconds, stage=name)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.add(name, seconds)
+
+
+# function to expose hit/miss counters of a TTLCache at scrape time
+def register_cache(name, cache):
+    def collect():
+        CACHE_HITS.set(cache.hits, cache=name)
+        CACHE_MISSES.set(cache.misses, cache=name)
+        CACHE_ENTRIES.set(len(cache), cache=name)
+
+    registry.collectors.append(collect)
+
+
+# function to expose connection pool usage at scrape time
+def register_pool(name, pool):
+    # pools such as SQLite's NullPool keep no counts
+    if not hasattr(pool, "checkedout"):
+        return
+
+    def collect():
+        DB_POOL_CHECKED_OUT.set(pool.checkedout(), pool=name)
+        DB_POOL_SIZE.set(pool.size(), pool=name)
+
+    registry.collectors.append(collect)
+
+
+# function to expose the slots and queue of a pool's admission control
+def register_admission(name, admission):
+    def collect():
+        ADMISSION_ACTIVE.set(admission.active, pool=name)
+        ADMISSION_QUEUED.set(admission.queued, pool=name)
+
+    registry.collectors.append(collect)
+
+
+# ASGI middleware recording request latency and in-flight requests, and
+# adding a Server-Timing header with the stage breakdown of each response
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings()
+        token = _request_timings.set(timings)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if timings.last_stage_end is not None:
+                    # response validation and serialization after the last stage
+                    seconds = time.perf_counter() - timings.last_stage_end
+                    STAGE_SECONDS.observe(seconds, stage="response")
+                    timings.add("response", seconds)
+                timings.stages["total"] = time.perf_counter() - started
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", timings.server_timing())
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            REQUESTS_IN_FLIGHT.dec()
+            route = scope.get("route")
+            REQUEST_SECONDS.observe(
+                time.perf_counter() - started,
+                route=getattr(route, "path", "unmatched"),
+                status=status,
+            )
+            _request_timings.reset(token)
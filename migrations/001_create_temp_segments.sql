@@ -0,0 +1,17 @@
+-- temp_segments maps each temp to the (city, state, speciality,
+-- certification) segments it works in; until it exists, or while it is
+-- empty, /v1/recommend-temp serves every segment the global rankings
+CREATE TABLE IF NOT EXISTS temp_segments (
+    tempid VARCHAR NOT NULL,
+    city VARCHAR NOT NULL,
+    state VARCHAR NOT NULL,
+    speciality VARCHAR NOT NULL,
+    certification VARCHAR NOT NULL,
+    PRIMARY KEY (tempid, city, state, speciality, certification)
+);
+
+CREATE INDEX IF NOT EXISTS ix_temp_segments_tempid ON temp_segments (tempid);
+CREATE INDEX IF NOT EXISTS ix_temp_segments_city ON temp_segments (city);
+CREATE INDEX IF NOT EXISTS ix_temp_segments_state ON temp_segments (state);
+CREATE INDEX IF NOT EXISTS ix_temp_segments_speciality ON temp_segments (speciality);
+CREATE INDEX IF NOT EXISTS ix_temp_segments_certification ON temp_segments (certification);
@@ -27,6 +27,18 @@ class TempData(Base):
     on_time_rate = Column(Integer, index=True)
 
 
+# Temp Segment Model: the city, state, speciality and certification a temp
+# works in, one row per segment
+class TempSegment(Base):
+    __tablename__ = "temp_segments"
+
+    tempid = Column(String, primary_key=True, index=True)
+    city = Column(String, primary_key=True, index=True)
+    state = Column(String, primary_key=True, index=True)
+    speciality = Column(String, primary_key=True, index=True)
+    certification = Column(String, primary_key=True, index=True)
+
+
 # Shift Data Model
 class ShiftData(Base):
     __tablename__ = "shifts_table"
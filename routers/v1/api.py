@@ -1,10 +1,15 @@
-from fastapi import APIRouter, Depends, Header, Query
-from sqlalchemy.orm import Session
+from typing import Optional
 
-from dependencies import get_db
+from fastapi import APIRouter, Depends, Header, Query, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from dependencies import admitted_db
 from logger import setup_logging
 from routers.v1 import schemas
 from routers.v1.crud import authentication, recommender
+from routers.v1.crud.response_cache import cached_response
+from routers.v1.crud.segments import temp_segment_holder
+from routers.v1.crud.shift_index import shift_index_holder
 
 logger = setup_logging()  # Getting a logger instance with the current module's name
 
@@ -14,49 +19,104 @@ router = APIRouter(prefix="/v1")
 
 # endpoint to authenticate user
 @router.post("/auth", response_model=schemas.LoginResponse)
-def authenticate_user(user_credentials: schemas.Login, db=Depends(get_db)):
-    data = authentication.user_authentication(user_credentials, db)
+async def authenticate_user(
+    user_credentials: schemas.Login, db=Depends(admitted_db("auth"))
+):
+    data = await authentication.user_authentication(user_credentials, db)
     return data
 
 
 # endpoint to get recommend temps based on city and state
 @router.get("/recommend-temp", response_model=schemas.TempRecommendations)
-def temp_recommender(
+async def temp_recommender(
+    request: Request,
     authorization: str = Header(...),
     city: str = Query(..., min_length=36, max_length=36),
     state: str = Query(..., min_length=36, max_length=36),
     speciality: str = Query(..., min_length=36, max_length=36),
     certificate: str = Query(..., min_length=36, max_length=36),
-    db: Session = Depends(get_db),
+    limit: int = Query(schemas.DEFAULT_PAGE_SIZE, ge=1, le=schemas.MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, max_length=200),
+    db: AsyncSession = Depends(admitted_db("recommend-temp")),
 ):
-    data = recommender.temp_recommender(
-        authorization=authorization,
-        city=city,
-        state=state,
-        speciality=speciality,
-        certificate=certificate,
-        db=db,
+    email = recommender.authorized_email(authorization)
+    params = {
+        "city": city,
+        "state": state,
+        "speciality": speciality,
+        "certificate": certificate,
+        "limit": limit,
+        "cursor": cursor,
+    }
+    return await cached_response(
+        request,
+        "recommend-temp",
+        params,
+        temp_segment_holder,
+        lambda: recommender.temp_recommender(email=email, db=db, **params),
     )
-    return data
 
 
 # endpoint to recommend shifts to temps based on city, state, speciality and certificate
 @router.get("/recommend-shifts", response_model=schemas.ShiftDataRecommendations)
-def shift_recommender(
-    # request: Request,
+async def shift_recommender(
+    request: Request,
     authorization: str = Header(...),
     city: str = Query(..., min_length=36, max_length=36),
     state: str = Query(..., min_length=36, max_length=36),
     speciality: str = Query(..., min_length=36, max_length=36),
     certificate: str = Query(..., min_length=36, max_length=36),
-    db: Session = Depends(get_db),
+    limit: int = Query(schemas.DEFAULT_PAGE_SIZE, ge=1, le=schemas.MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, max_length=200),
+    within_days: Optional[int] = Query(None, ge=1, le=schemas.MAX_SHIFT_WINDOW_DAYS),
+    is_long_term: Optional[bool] = Query(None),
+    db: AsyncSession = Depends(admitted_db("recommend-shifts")),
+):
+    email = recommender.authorized_email(authorization)
+    params = {
+        "city": city,
+        "state": state,
+        "speciality": speciality,
+        "certificate": certificate,
+        "limit": limit,
+        "cursor": cursor,
+        "within_days": within_days,
+        "is_long_term": is_long_term,
+    }
+    return await cached_response(
+        request,
+        "recommend-shifts",
+        params,
+        shift_index_holder,
+        lambda: recommender.shift_recommender(email=email, db=db, **params),
+    )
+
+
+# endpoint to recommend temps for many query tuples in one call
+@router.post("/recommend-temp/batch", response_model=schemas.TempBatchRecommendations)
+async def temp_batch_recommender(
+    batch: schemas.BatchRecommendationRequest,
+    authorization: str = Header(...),
+    db: AsyncSession = Depends(admitted_db("recommend-temp-batch")),
+):
+    email = recommender.authorized_email(authorization)
+    data = await recommender.temp_batch_recommender(
+        email=email, queries=batch.queries, db=db
+    )
+    return data
+
+
+# endpoint to recommend shifts for many query tuples in one call
+@router.post(
+    "/recommend-shifts/batch", response_model=schemas.ShiftBatchRecommendations
+)
+async def shift_batch_recommender(
+    batch: schemas.BatchRecommendationRequest,
+    authorization: str = Header(...),
+    db: AsyncSession = Depends(admitted_db("recommend-shifts-batch")),
 ):
-    data = recommender.shift_recommender(
-        authorization=authorization,
-        city=city,
-        state=state,
-        speciality=speciality,
-        certificate=certificate,
-        db=db,
+    email = recommender.authorized_email(authorization)
+    data = await recommender.shift_batch_recommender(
+        email=email, queries=batch.queries, db=db
     )
     return data
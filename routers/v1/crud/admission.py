@@ -0,0 +1,105 @@
+import asyncio
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+from fastapi import HTTPException
+
+import metrics
+
+# requests queued for a database slot before new ones are shed
+ADMISSION_QUEUE_SIZE = int(os.getenv("ADMISSION_QUEUE_SIZE", "50"))
+# seconds a queued request waits for a slot before it is shed
+ADMISSION_QUEUE_TIMEOUT = int(os.getenv("ADMISSION_QUEUE_TIMEOUT", "5"))
+ADMISSION_RETRY_AFTER = os.getenv("ADMISSION_RETRY_AFTER", "1")
+
+
+# Admission control in front of a database pool: at most `limit` requests hold
+# a slot, up to `queue_size` more wait for one in arrival order and the rest
+# get an immediate 503, instead of queueing on pool checkout
+class AdmissionController:
+    def __init__(
+        self,
+        pool,
+        limit,
+        queue_size=ADMISSION_QUEUE_SIZE,
+        timeout=ADMISSION_QUEUE_TIMEOUT,
+    ):
+        self.pool = pool
+        self.limit = limit
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.active = 0
+        self._waiters = deque()
+        metrics.register_admission(pool, self)
+
+    @property
+    def queued(self):
+        return len(self._waiters)
+
+    # function to hold a slot for the duration of the block; route only labels
+    # the wait and rejection metrics
+    @asynccontextmanager
+    async def admit(self, route):
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+        else:
+            await self._wait(route)
+        try:
+            yield
+        finally:
+            self._release()
+
+    # function to queue for a slot, which _release hands over directly
+    async def _wait(self, route):
+        if len(self._waiters) >= self.queue_size:
+            self._reject(route, "queue_full")
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(waiter, self.timeout)
+        except asyncio.TimeoutError:
+            self._reject(route, "timeout")
+        except BaseException:
+            # cancelled after being handed a slot, so pass it on
+            if waiter.done() and not waiter.cancelled():
+                self._release()
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+            metrics.ADMISSION_WAIT_SECONDS.observe(
+                time.perf_counter() - started, route=route
+            )
+
+    def _release(self):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    def _reject(self, route, reason):
+        metrics.ADMISSION_REJECTED.inc(route=route, reason=reason)
+        raise HTTPException(
+            status_code=503,
+            detail="Server is busy, please retry",
+            headers={"Retry-After": ADMISSION_RETRY_AFTER},
+        )
+
+
+# function to hold a slot of the admission control a session was opened
+# under, if any, while the block checks out and uses a connection; requests
+# served from caches and in-memory indexes never take one
+@asynccontextmanager
+async def database_slot(db):
+    admission = db.info.get("admission")
+    if admission is None:
+        yield
+    else:
+        controller, route = admission
+        async with controller.admit(route):
+            yield
@@ -1,45 +1,118 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
 from fastapi import HTTPException
 from jose import jwt
-from passlib.context import CryptContext
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
+import metrics
 from config import JWT_KEY
 from logger import setup_logging
 from models import UserCredentialsDatabaseModel
 from routers.v1 import schemas
+from routers.v1.crud.admission import database_slot
+from routers.v1.crud.passwords import verify_password
 
 logger = setup_logging()
 
-# Initialize the CryptContext
-pwd_context = CryptContext(
-    schemes=["bcrypt_sha256"],
-    deprecated="auto",
+PASSWORD_VERIFY_WORKERS = int(os.getenv("PASSWORD_VERIFY_WORKERS", "2"))
+PASSWORD_VERIFY_QUEUE_SIZE = int(os.getenv("PASSWORD_VERIFY_QUEUE_SIZE", "64"))
+
+
+# Process pool for bcrypt checks, so login bursts cannot take the CPU and the
+# threadpool away from recommend traffic
+class PasswordVerifier:
+    def __init__(self, max_workers, max_pending):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor = None
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._executor
+
+    # function to verify a password in the pool, rejecting once the queue is full
+    async def verify(self, password, hashed_password):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                logger.error("Password verification queue is full")
+                raise HTTPException(
+                    status_code=503,
+                    detail="Too many login attempts, retry later",
+                    headers={"Retry-After": "1"},
+                )
+            self._pending += 1
+        try:
+            executor = self._get_executor()
+            return await asyncio.get_running_loop().run_in_executor(
+                executor, verify_password, password, hashed_password
+            )
+        except BrokenProcessPool:
+            # a crashed worker breaks the whole pool; start a fresh one next time
+            with self._lock:
+                if self._executor is executor:
+                    self._executor = None
+            raise
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+password_verifier = PasswordVerifier(
+    PASSWORD_VERIFY_WORKERS, PASSWORD_VERIFY_QUEUE_SIZE
 )
 
 
 # User Credential Verification
-def validate_user_credentials(user_credentials: schemas.Login, db: Session):
-    # Query the user_credentials table for the provided email
-    user = (
-        db.query(UserCredentialsDatabaseModel)
-        .filter(UserCredentialsDatabaseModel.email == user_credentials.email)
-        .first()
-    )
-    if user and pwd_context.verify(user_credentials.password, user.password):
-        return True
-    else:
+async def validate_user_credentials(user_credentials: schemas.Login, db: AsyncSession):
+    async with database_slot(db):
+        try:
+            with metrics.stage("db_checkout"):
+                await db.connection()
+            # Query the user_credentials table for the provided email
+            with metrics.stage("db_read"):
+                result = await db.execute(
+                    select(UserCredentialsDatabaseModel).filter(
+                        UserCredentialsDatabaseModel.email == user_credentials.email
+                    )
+                )
+                user = result.scalars().first()
+        finally:
+            # release the connection before the CPU-bound hash check
+            await db.close()
+    if not user:
         return False
+    with metrics.stage("password_verify"):
+        return await password_verifier.verify(user_credentials.password, user.password)
 
 
-def user_authentication(user_credentials, db: Session):  # schemas.Login
+async def user_authentication(user_credentials, db: AsyncSession):  # schemas.Login
     # Password hashing context
-    if validate_user_credentials(user_credentials, db):
+    if await validate_user_credentials(user_credentials, db):
         # Generate a JWT token for the authenticated user
         token = jwt.encode(
             {"email": user_credentials.email}, JWT_KEY, algorithm="HS256"
         )
-        logger.info(f"Token generated for user {user_credentials.email}")
+        logger.info("Token generated for user %s", user_credentials.email)
         return {"token": token}
     else:
-        logger.error(f"Invalid credentials for user:- {user_credentials.email}")
+        logger.error("Invalid credentials for user:- %s", user_credentials.email)
         raise HTTPException(status_code=401, detail="Invalid credentials")
@@ -1,17 +1,155 @@
-import pandas as pd
+import hashlib
+import os
+import tempfile
+from datetime import date
+
+import numpy as np
 from fastapi import HTTPException, status
+from sqlalchemy import inspect, or_, select, text
 
 from logger import setup_logging
-from models import Badge, ShiftData, TempData
+from models import Badge, ShiftData, TempData, TempSegment
 
 logger = setup_logging()
 
+LOAD_CHUNK_SIZE = int(os.getenv("LOAD_CHUNK_SIZE", "10000"))
+# bytes of COPY output kept in memory before it spills to a temporary file
+COPY_SPOOL_SIZE = int(os.getenv("COPY_SPOOL_SIZE", str(64 * 2**20)))
+# marker COPY writes for NULL, which CSV cannot tell apart from '' otherwise
+COPY_NULL = r"\N"
+
+# columns read by the recommender indexes and the numpy dtype of each
+TEMP_COLUMNS = [
+    (TempData.tempid, object),
+    (TempData.attendance_score, float),
+    (TempData.on_time_rate, float),
+]
+SHIFT_COLUMNS = [
+    (ShiftData.id, object),
+    (ShiftData.speciality, object),
+    (ShiftData.certification, object),
+    (ShiftData.city, object),
+    (ShiftData.state, object),
+    (ShiftData.date, "datetime64[D]"),
+    (ShiftData.is_long_term, bool),
+]
+
+SEGMENT_COLUMNS = [
+    (TempSegment.tempid, object),
+    (TempSegment.city, object),
+    (TempSegment.state, object),
+    (TempSegment.speciality, object),
+    (TempSegment.certification, object),
+]
+
+
+# function to load columns into numpy arrays, through COPY on psycopg2
+# connections and a server-side cursor on any other driver
+def fetch_columns(db, columns, criteria=(), chunksize=LOAD_CHUNK_SIZE):
+    statement = select(*(column for column, _ in columns)).where(*criteria)
+    if db.bind.dialect.driver == "psycopg2":
+        return copy_columns(db, statement, columns, chunksize)
+    return stream_columns(db, statement, columns, chunksize)
+
+
+# function to stream COPY ... TO STDOUT as CSV and parse it column-wise with
+# pandas' C reader, so rows never become Python objects
+def copy_columns(db, statement, columns, chunksize=LOAD_CHUNK_SIZE):
+    query = statement.compile(
+        dialect=db.bind.dialect, compile_kwargs={"literal_binds": True}
+    )
+    cursor = db.connection().connection.cursor()
+    with tempfile.SpooledTemporaryFile(max_size=COPY_SPOOL_SIZE) as buffer:
+        try:
+            cursor.copy_expert(
+                f"COPY ({query}) TO STDOUT WITH (FORMAT csv, NULL '{COPY_NULL}')",
+                buffer,
+            )
+        finally:
+            cursor.close()
+        buffer.seek(0)
+        return read_copy_csv(buffer, columns, chunksize)
+
+
+# function to parse COPY CSV output into one typed numpy array per column
+def read_copy_csv(buffer, columns, chunksize=LOAD_CHUNK_SIZE):
+    # pandas is imported on first load to keep boot fast
+    import pandas as pd
+
+    names = [column.key for column, _ in columns]
+    chunks = [[] for _ in columns]
+    if not buffer.read(1):
+        # read_csv rejects empty input; COPY writes nothing for no rows
+        reader = []
+    else:
+        buffer.seek(0)
+        reader = pd.read_csv(
+            buffer,
+            header=None,
+            names=names,
+            # everything but floats is parsed as text and typed below, so ids
+            # keep their exact spelling
+            dtype={
+                column.key: float if dtype is float else object
+                for column, dtype in columns
+            },
+            na_values=[COPY_NULL],
+            keep_default_na=False,
+            chunksize=chunksize,
+        )
+    for frame in reader:
+        for position, (column, dtype) in enumerate(columns):
+            values = frame[column.key]
+            if dtype is float:
+                chunks[position].append(values.to_numpy(dtype=float))
+                continue
+            values = values.to_numpy(dtype=object)
+            values[pd.isna(values)] = None
+            if dtype is bool:
+                # PostgreSQL writes booleans as t/f; NULL is False as in the
+                # streamed path
+                chunks[position].append(values == "t")
+            else:
+                chunks[position].append(np.array(values, dtype=dtype))
+    return {
+        column.key: np.concatenate(parts) if parts else np.empty(0, dtype=dtype)
+        for (column, dtype), parts in zip(columns, chunks)
+    }
+
+
+# function to stream columns through a server-side cursor into numpy arrays,
+# holding at most one chunk of rows as Python objects at a time
+def stream_columns(db, statement, columns, chunksize=LOAD_CHUNK_SIZE):
+    statement = statement.execution_options(stream_results=True, yield_per=chunksize)
+    chunks = [[] for _ in columns]
+    for rows in db.execute(statement).partitions(chunksize):
+        for position, values in enumerate(zip(*rows)):
+            chunks[position].append(np.array(values, dtype=columns[position][1]))
+    return {
+        column.key: np.concatenate(parts) if parts else np.empty(0, dtype=dtype)
+        for (column, dtype), parts in zip(columns, chunks)
+    }
+
+
+# function to get the temp columns used by the temp feature store
+def fetch_temps_columns(db):
+    return fetch_columns(db, TEMP_COLUMNS)
 
-# function to get all temps data from temps table
-def fetch_temps_data_to_dataframe(db):
-    query = db.query(TempData)
-    df = pd.read_sql(query.statement, db.bind)
-    return df
+
+# function to get every temp's segments from temp_segments table
+def fetch_segment_columns(db):
+    if not table_exists(db, TempSegment):
+        # schemas not yet migrated have no segments
+        return {
+            column.key: np.empty(0, dtype=dtype) for column, dtype in SEGMENT_COLUMNS
+        }
+    return fetch_columns(db, SEGMENT_COLUMNS)
+
+
+# function to check whether a model's table exists, for tables that deployed
+# schemas may not have yet
+def table_exists(db, model):
+    return inspect(db.connection()).has_table(model.__tablename__)
 
 
 # function to get all badges data from badges table
@@ -24,8 +162,41 @@ def fetch_badge_data_from_db(db):
     return badge
 
 
-# function to fetch shift data from shifts_table
-def fetch_shift_data_to_dataframe(db):
-    query = db.query(ShiftData)
-    df = pd.read_sql(query.statement, db.bind)
-    return df
+# function to get the shift columns used by the shift index, skipping shifts
+# dated before today since they can no longer be recommended
+def fetch_shift_columns(db):
+    return fetch_columns(
+        db,
+        SHIFT_COLUMNS,
+        criteria=[or_(ShiftData.date >= date.today(), ShiftData.date.is_(None))],
+    )
+
+
+# function to get a cheap change token for a table, used to detect stale indexes
+def fetch_table_version(db, model):
+    table_name = model.__tablename__
+    if db.bind.dialect.name == "postgresql":
+        # write counters from the statistics collector avoid scanning the table
+        row = db.execute(
+            text(
+                "SELECT n_tup_ins, n_tup_upd, n_tup_del FROM pg_stat_user_tables "
+                "WHERE relname = :table_name"
+            ),
+            {"table_name": table_name},
+        ).first()
+        if row is not None:
+            return tuple(row)
+    # other backends keep no write counters, so the token digests the rows in
+    # key order; a full scan, which also catches updates that a row count
+    # would miss
+    table = model.__table__
+    digest = hashlib.sha1()
+    count = 0
+    rows = db.execute(
+        select(*table.columns).order_by(*table.primary_key.columns),
+        execution_options={"yield_per": LOAD_CHUNK_SIZE},
+    )
+    for row in rows:
+        digest.update(repr(tuple(row)).encode())
+        count += 1
+    return count, digest.hexdigest()
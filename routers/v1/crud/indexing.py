@@ -0,0 +1,228 @@
+import os
+import threading
+
+from fastapi.concurrency import run_in_threadpool
+
+import metrics
+from logger import setup_logging
+from routers.v1.crud import snapshots
+from routers.v1.crud.admission import database_slot
+from routers.v1.crud.singleflight import SingleFlight
+
+logger = setup_logging()
+
+INDEX_REFRESH_INTERVAL = int(os.getenv("INDEX_REFRESH_INTERVAL", "60"))
+
+
+# Long-lived holder for an in-memory index shared by all requests
+class IndexHolder:
+    def __init__(
+        self,
+        name,
+        loader,
+        builder,
+        versioner,
+        dependencies=(),
+        saver=None,
+        opener=None,
+    ):
+        self.name = name
+        self._loader = loader
+        self._builder = builder
+        self._versioner = versioner
+        # write an index to / memory-map it from a snapshot directory
+        self._saver = saver
+        self._opener = opener
+        # holders whose indexes the loader reads, built first on the async path
+        self.dependencies = list(dependencies)
+        # (version, index) pair, always replaced as a single reference so
+        # readers never observe a half-built index
+        self._current = None
+        self._stale = False
+        self._build_lock = threading.Lock()
+        # requests arriving while the first build runs wait for it instead of
+        # reading the table again
+        self._flight = SingleFlight(name)
+        self._listeners = []
+
+    @property
+    def version(self):
+        current = self._current
+        return current[0] if current is not None else None
+
+    # (version, index) pair currently served, or None before the first build
+    @property
+    def current(self):
+        return self._current
+
+    # function to get the current index, building it on first use
+    def get(self, db):
+        current = self._current
+        if current is None:
+            with self._build_lock:
+                if self._current is None:
+                    self._build(db, self._versioner(db))
+            current = self._current
+        return current[1]
+
+    # function to get the current index from the async request path; on first
+    # use the rows are read over the async session, its connection is released
+    # and the CPU-bound build runs in the threadpool
+    async def aget(self, db):
+        current = self._current
+        if current is not None:
+            metrics.INDEX_LOOKUPS.inc(index=self.name, result="hit")
+            return current[1]
+        metrics.INDEX_LOOKUPS.inc(index=self.name, result="build")
+        return await self._flight.do("build", lambda: self._abuild(db))
+
+    async def _abuild(self, db):
+        if self._current is not None:
+            return self._current[1]
+        for dependency in self.dependencies:
+            await dependency.aget(db)
+        async with database_slot(db):
+            try:
+                with metrics.stage("db_checkout"):
+                    await db.connection()
+                with metrics.stage("db_read"):
+                    version, data = await db.run_sync(self._load)
+            finally:
+                await db.close()
+        with metrics.stage("index_build"):
+            await run_in_threadpool(self._install_if_missing, version, data)
+        return self._current[1]
+
+    # function to rebuild the index if the underlying table version changed;
+    # a snapshot directory published at that version is memory-mapped instead,
+    # so workers keep sharing one copy across table changes
+    def refresh(self, db, force=False, snapshot=None):
+        with self._build_lock:
+            version = self._versioner(db)
+            current = self._current
+            if force or self._stale or current is None or current[0] != version:
+                if force or not self._open_if_current(snapshot, version):
+                    self._build(db, version)
+            return self._current
+
+    # function to mark the index stale so the next refresh rebuilds it
+    def invalidate(self):
+        self._stale = True
+
+    # function to register a callback run after every rebuild of this index
+    def subscribe(self, callback):
+        self._listeners.append(callback)
+
+    # function to get the directory of this index inside a snapshot
+    def snapshot_path(self, root):
+        return os.path.join(root, self.name.replace(" ", "_"))
+
+    # function to write the current index and its version to a snapshot
+    def save_snapshot(self, root):
+        version, index = self._current
+        path = self.snapshot_path(root)
+        self._saver(index, path)
+        snapshots.save_version(path, version)
+
+    # function to install the index memory-mapped from a snapshot; refresh
+    # keeps it until the table version moves past the snapshot's
+    def load_snapshot(self, root):
+        version, index = self.open_snapshot(root)
+        with self._build_lock:
+            self._set(version, index)
+        logger.info("Loaded %s index at version %s from %s", self.name, version, root)
+
+    # function to read a snapshot's version and index without installing it
+    def open_snapshot(self, root):
+        path = self.snapshot_path(root)
+        return snapshots.load_version(path), self._opener(path)
+
+    def _open_if_current(self, snapshot, version):
+        if snapshot is None or self._opener is None:
+            return False
+        path = self.snapshot_path(snapshot)
+        try:
+            if snapshots.load_version(path) != version:
+                return False
+            self._set(version, self._opener(path))
+        except Exception as e:
+            logger.error("Error loading %s index snapshot: %s", self.name, e)
+            return False
+        logger.info("Loaded %s index at version %s from %s", self.name, version, path)
+        return True
+
+    def _load(self, db):
+        return self._versioner(db), self._loader(db)
+
+    def _install_if_missing(self, version, data):
+        with self._build_lock:
+            if self._current is None:
+                self._install(version, data)
+
+    def _build(self, db, version):
+        self._install(version, self._loader(db))
+
+    def _install(self, version, data):
+        self._set(version, self._builder(data))
+        logger.info("Built %s index at version %s", self.name, version)
+
+    def _set(self, version, index):
+        self._current = (version, index)
+        self._stale = False
+        for callback in self._listeners:
+            callback()
+
+
+# function to install every holder's index from a snapshot directory, leaving
+# holders that fail to load to be built from the database as before
+def load_snapshots(holders, root):
+    loaded = True
+    for holder in holders:
+        try:
+            holder.load_snapshot(root)
+        except Exception as e:
+            logger.error("Error loading %s index snapshot: %s", holder.name, e)
+            loaded = False
+    return loaded
+
+
+# Background thread that keeps registered index holders up to date, from the
+# newest snapshot under snapshot_root when it matches the tables
+class BackgroundRefresher(threading.Thread):
+    def __init__(
+        self,
+        session_factory,
+        holders,
+        interval=INDEX_REFRESH_INTERVAL,
+        snapshot_root=None,
+    ):
+        super().__init__(name="index-refresher", daemon=True)
+        self.session_factory = session_factory
+        self.holders = list(holders)
+        self.interval = interval
+        self.snapshot_root = snapshot_root
+        self._stop_event = threading.Event()
+
+    def run(self):
+        self.refresh_all()
+        while not self._stop_event.wait(self.interval):
+            self.refresh_all()
+
+    # function to refresh every holder, each with its own short-lived session
+    def refresh_all(self):
+        snapshot = None
+        if self.snapshot_root is not None:
+            snapshot = snapshots.latest_snapshot(self.snapshot_root)
+        for holder in self.holders:
+            db = self.session_factory()
+            try:
+                holder.refresh(db, snapshot=snapshot)
+            except Exception as e:
+                logger.error("Error refreshing %s index: %s", holder.name, e)
+            finally:
+                db.close()
+
+    def stop(self, timeout=5):
+        self._stop_event.set()
+        if self.is_alive():
+            self.join(timeout)
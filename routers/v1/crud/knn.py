@@ -0,0 +1,62 @@
+import os
+
+import numpy as np
+
+METRICS = ("cosine", "jaccard", "manhattan", "minkowski", "euclidean")
+# metrics a KD-tree can answer exactly; cosine and jaccard stay brute force
+TREE_METRICS = ("manhattan", "minkowski", "euclidean")
+KNN_TREE_THRESHOLD = int(os.getenv("KNN_TREE_THRESHOLD", "20000"))
+
+
+# function to select the k smallest distances of every row in ascending order
+def top_k_smallest(distances, k):
+    n_rows, n_columns = distances.shape
+    k = min(k, n_columns)
+    if k == 0:
+        return (
+            np.empty((n_rows, 0), dtype=np.intp),
+            np.empty((n_rows, 0), dtype=distances.dtype),
+        )
+    if k < n_columns:
+        candidates = np.argpartition(distances, k - 1, axis=1)[:, :k]
+    else:
+        candidates = np.broadcast_to(np.arange(n_columns), (n_rows, n_columns))
+    candidate_distances = np.take_along_axis(distances, candidates, axis=1)
+    order = np.argsort(candidate_distances, axis=1, kind="stable")
+    return (
+        np.take_along_axis(candidates, order, axis=1),
+        np.take_along_axis(candidate_distances, order, axis=1),
+    )
+
+
+# Batched k-nearest-neighbour search over a dense feature matrix
+class KNNIndex:
+    def __init__(self, matrix, metric, tree_threshold=KNN_TREE_THRESHOLD):
+        if metric not in METRICS:
+            raise ValueError(
+                "Invalid metric. Choose from 'cosine', 'jaccard', 'manhattan', 'minkowski', 'euclidean'."
+            )
+        self.matrix = matrix
+        self.metric = metric
+        self.tree = None
+        if metric in TREE_METRICS and len(matrix) >= tree_threshold:
+            # scikit-learn is imported on first use to keep boot fast
+            from sklearn.neighbors import NearestNeighbors
+
+            self.tree = NearestNeighbors(algorithm="kd_tree", metric=metric).fit(matrix)
+
+    # function to compute the full distance matrix between points and the index
+    def distances(self, points):
+        from sklearn.metrics.pairwise import cosine_similarity, pairwise_distances
+
+        if self.metric == "cosine":
+            return 1 - cosine_similarity(points, self.matrix)
+        return pairwise_distances(points, self.matrix, metric=self.metric)
+
+    # function to find the k nearest rows for every point in one pass
+    def query(self, points, k):
+        k = min(k, len(self.matrix))
+        if self.tree is not None and k > 0:
+            distances, indices = self.tree.kneighbors(points, n_neighbors=k)
+            return indices, distances
+        return top_k_smallest(self.distances(points), k)
@@ -0,0 +1,131 @@
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+
+from models import Badge
+from routers.v1.crud import helper
+from routers.v1.crud.indexing import IndexHolder
+from routers.v1.crud.pagination import encode_cursor
+from routers.v1.crud.serialization import dumps
+from routers.v1.crud.temp_store import rank_temps_batch, temp_store_holder
+from routers.v1.schemas import DEFAULT_PAGE_SIZE
+
+TEMP_METRIC = "minkowski"
+# number of ranked temps kept per badge, i.e. how deep clients can page
+TEMP_RANKING_DEPTH = int(os.getenv("TEMP_RANKING_DEPTH", "100"))
+RECOMMENDATIONS_FILE = "temps.json"
+
+
+# Precomputed badge -> ranked temps and distances, served by /v1/recommend-temp
+class TempRecommendationStore:
+    def __init__(self, temps, distances, computed_at, version=None):
+        self.temps = temps
+        self.distances = distances
+        self.computed_at = computed_at
+        # what page cursors are tied to: a digest of the rankings unless they
+        # carry a data version of their own, so every worker that ranked the
+        # same data accepts the same cursors
+        if version is None:
+            version = hashlib.sha1(dumps((temps, distances))).hexdigest()
+        self.version = version
+        # the first page is serialized once per build, so requests for it
+        # only copy bytes
+        first_page = self.page(0, DEFAULT_PAGE_SIZE)
+        self.temps_json = dumps(first_page["data"]["temps"])
+        self.computed_at_json = dumps(computed_at)
+        self.body = dumps(first_page)
+
+    # function to get a page of every badge's ranking; cursors are tied to
+    # version, so they expire when the rankings change
+    def page(self, offset, limit):
+        end = offset + limit
+        has_more = any(len(tempids) > end for tempids in self.temps.values())
+        return {
+            "data": {
+                "temps": {
+                    badge: tempids[offset:end] for badge, tempids in self.temps.items()
+                },
+                "distances": {
+                    badge: distances[offset:end]
+                    for badge, distances in self.distances.items()
+                },
+                "computed_at": self.computed_at,
+                "next_cursor": (encode_cursor(end, self.version) if has_more else None),
+            }
+        }
+
+
+# function to load the temp feature store and badge thresholds
+def load_recommendation_inputs(db):
+    temp_store = temp_store_holder.get(db)
+    badges = [
+        (badge.badge_name, badge.attendance_score_threshold, badge.on_time_threshold)
+        for badge in helper.fetch_badge_data_from_db(db)
+    ]
+    return temp_store, badges
+
+
+# function to rank temps for every badge in one batched kNN query
+def build_temp_recommendations(inputs, computed_at=None, version=None):
+    temp_store, badges = inputs
+    input_data_list = [
+        {
+            "attendance_score": attendance_score_threshold,
+            "on_time_rate": on_time_threshold,
+        }
+        for _, attendance_score_threshold, on_time_threshold in badges
+    ]
+    rankings = rank_temps_batch(
+        input_data_list, temp_store=temp_store, metric=TEMP_METRIC, k=TEMP_RANKING_DEPTH
+    )
+    temps = {badge[0]: tempids for badge, (tempids, _) in zip(badges, rankings)}
+    distances = {badge[0]: dists for badge, (_, dists) in zip(badges, rankings)}
+    if computed_at is None:
+        computed_at = datetime.now(timezone.utc)
+    return TempRecommendationStore(temps, distances, computed_at, version)
+
+
+# function to write the materialized recommendations to a snapshot
+def save_temp_recommendations(recommendations, path):
+    os.makedirs(path, exist_ok=True)
+    with open(os.path.join(path, RECOMMENDATIONS_FILE), "w") as snapshot_file:
+        json.dump(
+            {
+                "temps": recommendations.temps,
+                "distances": recommendations.distances,
+                "computed_at": recommendations.computed_at.isoformat(),
+            },
+            snapshot_file,
+        )
+
+
+# function to read the materialized recommendations from a snapshot
+def load_temp_recommendations(path):
+    with open(os.path.join(path, RECOMMENDATIONS_FILE)) as snapshot_file:
+        snapshot = json.load(snapshot_file)
+    return TempRecommendationStore(
+        snapshot["temps"],
+        snapshot["distances"],
+        datetime.fromisoformat(snapshot["computed_at"]),
+    )
+
+
+# function to get the combined change token of csv_data and badges
+def fetch_temp_recommendation_version(db):
+    temp_store_holder.get(db)
+    return temp_store_holder.version, helper.fetch_table_version(db, Badge)
+
+
+temp_recommendation_holder = IndexHolder(
+    "temp recommendation",
+    loader=load_recommendation_inputs,
+    builder=build_temp_recommendations,
+    versioner=fetch_temp_recommendation_version,
+    dependencies=[temp_store_holder],
+    saver=save_temp_recommendations,
+    opener=load_temp_recommendations,
+)
+
+# recompute as soon as the refresher gets to it whenever temp data is rebuilt
+temp_store_holder.subscribe(temp_recommendation_holder.invalidate)
@@ -0,0 +1,71 @@
+import base64
+import hashlib
+import os
+
+from fastapi import HTTPException
+
+import metrics
+from routers.v1.crud.cache import TTLCache
+from routers.v1.schemas import MAX_PAGE_SIZE
+
+RANKING_CACHE_SIZE = int(os.getenv("RANKING_CACHE_SIZE", "10000"))
+RANKING_CACHE_TTL = int(os.getenv("RANKING_CACHE_TTL", "300"))
+# pages of the largest size a query is ranked for on its first request, so the
+# following pages are served from the cached ranking
+RANKING_PREFETCH_PAGES = int(os.getenv("RANKING_PREFETCH_PAGES", "2"))
+
+# (query, index version) -> (rows, scores, depth) of the ranked list of a query
+ranking_cache = TTLCache(RANKING_CACHE_SIZE, RANKING_CACHE_TTL)
+metrics.register_cache("ranking", ranking_cache)
+
+
+def _tag(version):
+    return hashlib.sha1(repr(version).encode()).hexdigest()[:16]
+
+
+# function to encode the offset of the next page as an opaque cursor, tied to
+# the version of the ranking it points into
+def encode_cursor(offset, version):
+    raw = f"{offset}:{_tag(version)}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+# function to get the offset of a cursor, rejecting cursors of a ranking that
+# has since been recomputed
+def decode_cursor(cursor, version):
+    if not cursor:
+        return 0
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        offset, tag = raw.split(":")
+        offset = int(offset)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if offset < 0:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if tag != _tag(version):
+        raise HTTPException(
+            status_code=400,
+            detail="Cursor expired, the recommendations were recomputed",
+        )
+    return offset
+
+
+# function to get one page of a query's ranked list; the first request ranks
+# RANKING_PREFETCH_PAGES full pages deep and rank(depth) only runs again when a
+# page lies past the cached depth, which then at least doubles
+def ranked_page(key, rank, offset, limit):
+    # one extra row tells whether there is a next page
+    needed = offset + limit + 1
+    cached = ranking_cache.get(key)
+    if cached is None or (cached[2] < needed and len(cached[0]) == cached[2]):
+        if cached is None:
+            depth = max(needed, RANKING_PREFETCH_PAGES * MAX_PAGE_SIZE + 1)
+        else:
+            depth = max(needed, 2 * cached[2])
+        rows, scores = rank(depth)
+        cached = (rows, scores, depth)
+        ranking_cache.set(key, cached)
+    rows, scores, _ = cached
+    end = offset + limit
+    return rows[offset:end], scores[offset:end], end if len(rows) > end else None
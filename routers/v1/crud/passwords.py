@@ -0,0 +1,19 @@
+from functools import lru_cache
+
+
+# function to get the password hashing context, created on first use since
+# passlib and bcrypt are only needed where hashes are actually checked
+@lru_cache(maxsize=None)
+def get_pwd_context():
+    from passlib.context import CryptContext
+
+    return CryptContext(
+        schemes=["bcrypt_sha256"],
+        deprecated="auto",
+    )
+
+
+# function to check a password against its hash; runs in the password
+# verification process pool, so this module must stay cheap to import
+def verify_password(password, hashed_password):
+    return get_pwd_context().verify(password, hashed_password)
@@ -1,219 +1,294 @@
-import numpy as np
+import os
+import time
+
 from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
 from jose import JWTError, jwt
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import (cosine_similarity, linear_kernel,
-                                      pairwise_distances)
-from sklearn.preprocessing import MinMaxScaler
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
+import metrics
 from config import JWT_KEY
-from logger import setup_logging
-from routers.v1.crud import helper
+from logger import log_payload, setup_logging
+from routers.v1.crud.cache import TTLCache
+from routers.v1.crud.materialized import temp_recommendation_holder
+from routers.v1.crud.pagination import decode_cursor, encode_cursor, ranked_page
+from routers.v1.crud.segments import segment_recommendations, temp_segment_holder
+from routers.v1.crud.serialization import dumps, json_response
+from routers.v1.crud.sharded import shift_scorer
+from routers.v1.crud.shift_index import shift_index_holder, upcoming_window
+from routers.v1.schemas import DEFAULT_PAGE_SIZE
 
 logger = setup_logging()
 
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+TOKEN_CACHE_TTL = int(os.getenv("TOKEN_CACHE_TTL", "300"))
+
+# validated token -> email, so hot clients skip decoding on every call
+token_cache = TTLCache(TOKEN_CACHE_SIZE, TOKEN_CACHE_TTL)
+metrics.register_cache("token", token_cache)
+
 
 # JWT token verification
 def verify_token(token: str):
+    email = token_cache.get(token)
+    if email is not None:
+        return email
     try:
         payload = jwt.decode(token, JWT_KEY, algorithms=["HS256"])
         email = payload.get("email")
         if email is None:
             raise HTTPException(status_code=401, detail="Invalid token")
         else:
+            ttl = TOKEN_CACHE_TTL
+            if "exp" in payload:
+                # never serve a token from cache past its own expiry
+                ttl = min(ttl, payload["exp"] - time.time())
+            token_cache.set(token, email, ttl=ttl)
             return email
     except JWTError:
         raise HTTPException(status_code=401, detail="Invalid token")
 
 
-# function to find similar temps and return list of temps
-def recommend_temps(
-    input_data, numerical_features, new_df, df, scaler, metric="cosine"
-):
-    try:
-        # Normalize input data if needed (assuming scaler is defined)
-        input_array = np.array(
-            [[input_data[feature] for feature in numerical_features]]
-        )
-        input_array = scaler.transform(input_array)
+# function to validate the bearer token of a request, once per request by its
+# route, and get the email it was issued to
+def authorized_email(authorization: str):
+    if not authorization or not authorization.startswith("Bearer "):
+        logger.error("Missing or invalid token")
+        raise HTTPException(status_code=401, detail="Missing or invalid token")
+    with metrics.stage("auth"):
+        return verify_token(authorization.split(" ")[1])
 
-        # Calculate pairwise distances with input data
-        if metric == "cosine":
-            distances = (
-                1 - cosine_similarity(input_array, new_df[numerical_features])[0]
-            )
-        elif metric == "jaccard":
-            distances = pairwise_distances(
-                input_array, new_df[numerical_features], metric="jaccard"
-            )[0]
-        elif metric == "manhattan":
-            distances = pairwise_distances(
-                input_array, new_df[numerical_features], metric="manhattan"
-            )[0]
-        elif metric == "minkowski":
-            distances = pairwise_distances(
-                input_array, new_df[numerical_features], metric="minkowski"
-            )[0]
-        elif metric == "euclidean":
-            distances = pairwise_distances(
-                input_array, new_df[numerical_features], metric="euclidean"
-            )[0]
-        else:
-            raise ValueError(
-                "Invalid metric. Choose from 'cosine', 'jaccard', 'manhattan', 'minkowski', 'euclidean'."
-            )
 
-        # Sort temps based on distances
-        temp_indices = np.argsort(distances)[:5]
-        # similarity_scores = [1 - distances[i] for i in temp_indices]
-        tempids = df.iloc[temp_indices]["tempid"].values
-        tempid_list = [str(x) for x in tempids]
-        return tempid_list
-    except Exception as e:
-        logger.error(f"Error in recommend_temps function: {e}")
-        raise HTTPException(status_code=500, detail="Internal Server Error")
+# function to get the badge rankings of a segment's temps; until any temp is
+# assigned a segment, every segment is served the global rankings
+async def scoped_recommendations(db, segment):
+    segment_index = await temp_segment_holder.aget(db)
+    if not segment_index:
+        return await temp_recommendation_holder.aget(db)
+    return await segment_recommendations(segment_index, segment)
 
 
 # API temp recommendation abstraction function
-def temp_recommender(
-    # request: Request,
-    authorization: str,
+async def temp_recommender(
+    email: str,
     city: str,
     state: str,
     speciality: str,
     certificate: str,
-    db: Session,
+    db: AsyncSession,
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: str = None,
 ):
-    # token = request.headers.get("authorization")
-    token = authorization
-    if not token or not token.startswith("Bearer "):
-        logger.error("Missing or invalid token")
-        return HTTPException(status_code=401, detail="Missing or invalid token")
-    token = token.split(" ")[1]
-    email = verify_token(token)
     try:
-        logger.info(f"Validated user {email}")
+        logger.info("Validated user %s", email)
         logger.info(
-            f"Input for temps given by {email}:- {[city,state,speciality,certificate]}"
+            "Input for temps given by %s:- %s",
+            email,
+            [city, state, speciality, certificate],
         )
-        temp_df = helper.fetch_temps_data_to_dataframe(db)
-        new_temp_df = helper.fetch_temps_data_to_dataframe(db)
-        badge_data = helper.fetch_badge_data_from_db(db)
-        scaler = MinMaxScaler()
-        numerical_features = ["attendance_score", "on_time_rate"]
-        new_temp_df[numerical_features] = scaler.fit_transform(
-            new_temp_df[numerical_features]
-        )
-        temp_recommendation_payload = {"data": {"temps": {}}}
-        for badge in badge_data:
-            input_data = {
-                "attendance_score": badge.attendance_score_threshold,
-                "on_time_rate": badge.on_time_threshold,
-            }
-            recommended_temps = recommend_temps(
-                input_data=input_data,
-                numerical_features=numerical_features,
-                new_df=new_temp_df,
-                df=temp_df,
-                scaler=scaler,
-                metric="minkowski",
+        with metrics.stage("index"):
+            recommendations = await scoped_recommendations(
+                db, (city, state, speciality, certificate)
             )
-            # badge_wise_recommendations = {badge.badge_name: recommended_temps}
-            temp_recommendation_payload["data"]["temps"][
-                badge.badge_name
-            ] = recommended_temps
-        if not temp_recommendation_payload["data"]["temps"]:
+        if recommendations is None or not recommendations.temps:
             logger.error(
                 "No recommendations available for the specified city and state"
             )
-            return HTTPException(
+            raise HTTPException(
                 status_code=404,
                 detail="No recommendations available for the specified city and state",
             )
-        logger.info(
-            f"Temps recommendations {temp_recommendation_payload} for user {email}"
+        offset = decode_cursor(cursor, recommendations.version)
+        log_payload(
+            logger,
+            "Temps recommendations %s for user %s",
+            recommendations.temps,
+            email,
         )
-        return temp_recommendation_payload
+        if offset == 0 and limit == DEFAULT_PAGE_SIZE:
+            # the materialized first page, serialized when it was computed
+            return recommendations.body
+        return dumps(recommendations.page(offset, limit))
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Error in temp_recommender endpoint: {e}")
+        logger.error("Error in temp_recommender endpoint: %s", e)
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
 
-# function to recommend shifts from database
+# function to recommend a page of shifts with their scores, from the ranking
+# cached per query and index version
 def recommend_shifts(
-    shift_df, tfidf_vectorizer, tfidf_matrix, certificate, city, state, speciality
+    shift_index,
+    certificate,
+    city,
+    state,
+    speciality,
+    version=None,
+    offset=0,
+    limit=DEFAULT_PAGE_SIZE,
+    within_days=None,
+    is_long_term=None,
 ):
     try:
-        query_text = f"{speciality} {certificate} {city}{state}"
-        query_vec = tfidf_vectorizer.transform([query_text])
-        sim_scores = linear_kernel(query_vec, tfidf_matrix).flatten()
-        top_indices = sim_scores.argsort()[-5:][::-1]
-        shift_ids = shift_df.iloc[top_indices]["id"].values
+        # values in the order of shift_index.SHIFT_COLUMNS
+        values = (speciality, certificate, city, state)
+        start, end = upcoming_window(within_days)
+        top_indices, scores, next_offset = ranked_page(
+            (values, version, start, end, is_long_term),
+            lambda depth: shift_index.rank(values, depth, start, end, is_long_term),
+            offset,
+            limit,
+        )
+        shift_ids = shift_index.ids[top_indices]
         shift_list = [str(x) for x in shift_ids]
-        return shift_list
+        return shift_list, scores.tolist(), next_offset
     except Exception as e:
-        logger.error(f"Error in recommend_shifts function: {e}")
+        logger.error("Error in recommend_shifts function: %s", e)
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
 
 # API shift recommender abstraction function
-def shift_recommender(
-    # request: Request,
-    authorization: str,
+async def shift_recommender(
+    email: str,
     city: str,
     state: str,
     speciality: str,
     certificate: str,
-    db: Session,
+    db: AsyncSession,
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: str = None,
+    within_days: int = None,
+    is_long_term: bool = None,
 ):
-    # token = request.headers.get("authorization") # for further refrence
-    token = authorization
-    if not token or not token.startswith("Bearer "):
-        logger.error("Missing or invalid token")
-        return HTTPException(status_code=401, detail="Missing or invalid token")
-    token = token.split(" ")[1]
-    email = verify_token(token)
     try:
-        logger.info(f"Validated user {email}")
+        logger.info("Validated user %s", email)
         logger.info(
-            f"Input for shifts given by {email}:- {[city,state,speciality,certificate]}"
+            "Input for shifts given by %s:- %s",
+            email,
+            [city, state, speciality, certificate, within_days, is_long_term],
         )
-        shift_df = helper.fetch_shift_data_to_dataframe(db)
-        shift_df["text"] = (
-            shift_df["speciality"]
-            + " "
-            + shift_df["certification"]
-            + " "
-            + shift_df["city"]
-            + " "
-            + shift_df["state"]
-        )
-        tfidf_vectorizer = TfidfVectorizer(stop_words="english")
-        tfidf_matrix = tfidf_vectorizer.fit_transform(shift_df["text"])
+        with metrics.stage("index"):
+            await shift_index_holder.aget(db)
+            # version and index read as one pair, to key the ranking cache
+            version, shift_index = shift_index_holder.current
+        offset = decode_cursor(cursor, version)
         shift_recommendation_payload = {"data": {"shift": None}}
-        recommended_shifts = recommend_shifts(
-            shift_df=shift_df,
-            tfidf_vectorizer=tfidf_vectorizer,
-            tfidf_matrix=tfidf_matrix,
-            certificate=certificate,
-            city=city,
-            state=state,
-            speciality=speciality,
-        )
+        with metrics.stage("score"):
+            recommended_shifts, scores, next_offset = await run_in_threadpool(
+                recommend_shifts,
+                shift_index=shift_index,
+                certificate=certificate,
+                city=city,
+                state=state,
+                speciality=speciality,
+                version=version,
+                offset=offset,
+                limit=limit,
+                within_days=within_days,
+                is_long_term=is_long_term,
+            )
         shift_recommendation_payload["data"]["shift"] = recommended_shifts
-        if not shift_recommendation_payload["data"]["shift"]:
+        shift_recommendation_payload["data"]["scores"] = scores
+        shift_recommendation_payload["data"]["next_cursor"] = (
+            encode_cursor(next_offset, version) if next_offset is not None else None
+        )
+        if not shift_recommendation_payload["data"]["shift"] and offset == 0:
             logger.error(
                 "No recommendations available for the specified city, state, speciality or certification"
             )
-            return HTTPException(
+            raise HTTPException(
                 status_code=404,
                 detail="No recommendations available for the specified city, state, speciality or certification",
             )
-        logger.info(
-            f"shifts recommendations {shift_recommendation_payload} for user {email}"
+        log_payload(
+            logger,
+            "shifts recommendations %s for user %s",
+            shift_recommendation_payload,
+            email,
         )
         return shift_recommendation_payload
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error in shift_recommender endpoint: %s", e)
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+
+# function to recommend shifts for many queries with one sparse product
+def recommend_shifts_batch(shift_index, queries):
+    values_list = [
+        (query.speciality, query.certificate, query.city, query.state)
+        for query in queries
+    ]
+    start, end = upcoming_window()
+    if shift_scorer is not None:
+        # scattered across the shard processes
+        results = shift_scorer.search_batch(shift_index, values_list, 5, start, end)
+    else:
+        results = shift_index.search_batch(values_list, 5, start, end)
+    return [[str(x) for x in shift_index.ids[top_indices]] for top_indices in results]
+
+
+# API batch temp recommendation abstraction function
+async def temp_batch_recommender(email: str, queries, db: AsyncSession):
+    try:
+        logger.info("Batch of %d temp queries given by %s", len(queries), email)
+        # queries of the same segment share its rankings, spliced in
+        # pre-serialized; a segment without temps gets empty rankings
+        rankings = {}
+        items = []
+        with metrics.stage("index"):
+            segment_index = await temp_segment_holder.aget(db)
+            for query in queries:
+                segment = (query.city, query.state, query.speciality, query.certificate)
+                if segment not in rankings:
+                    rankings[segment] = await scoped_recommendations(db, segment)
+                recommendations = rankings[segment]
+                temps_json = (
+                    recommendations.temps_json
+                    if recommendations is not None
+                    else segment_index.empty_temps_json
+                )
+                items.append(
+                    b'{"query":%s,"temps":%s}' % (dumps(query.model_dump()), temps_json)
+                )
+        computed_at = max(
+            (
+                recommendations.computed_at
+                for recommendations in rankings.values()
+                if recommendations is not None
+            ),
+            default=None,
+        )
+        return json_response(
+            b'{"data":[%s],"computed_at":%s}' % (b",".join(items), dumps(computed_at))
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error in temp_batch_recommender endpoint: %s", e)
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+
+# API batch shift recommendation abstraction function
+async def shift_batch_recommender(email: str, queries, db: AsyncSession):
+    try:
+        logger.info("Batch of %d shift queries given by %s", len(queries), email)
+        with metrics.stage("index"):
+            shift_index = await shift_index_holder.aget(db)
+        with metrics.stage("score"):
+            recommended_shifts = await run_in_threadpool(
+                recommend_shifts_batch, shift_index, queries
+            )
+        return {
+            "data": [
+                {"query": query, "shift": shift_list}
+                for query, shift_list in zip(queries, recommended_shifts)
+            ]
+        }
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Error in shift_recommender endpoint: {e}")
+        logger.error("Error in shift_batch_recommender endpoint: %s", e)
         raise HTTPException(status_code=500, detail="Internal Server Error")
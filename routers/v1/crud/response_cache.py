@@ -0,0 +1,69 @@
+import hashlib
+import os
+
+from fastapi import Request, Response
+
+import metrics
+from logger import setup_logging
+from routers.v1.crud.cache import TTLCache
+from routers.v1.crud.serialization import dumps, json_response
+from routers.v1.crud.singleflight import SingleFlight
+
+logger = setup_logging()
+
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "10000"))
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "300"))
+
+# (endpoint, params, data version) -> serialized response body
+response_cache = TTLCache(RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL)
+metrics.register_cache("response", response_cache)
+# identical requests missing the cache at once share one computation
+response_flight = SingleFlight("response")
+
+
+# function to normalize query params so equivalent requests share an entry
+def normalize_params(params):
+    return tuple(sorted((name, str(value)) for name, value in params.items()))
+
+
+# function to get the entity tag of a response; the body is fully determined
+# by the endpoint, its params and the version of the index it was served from
+def etag_for(key):
+    return '"%s"' % hashlib.sha1(repr(key).encode()).hexdigest()
+
+
+# function to check an If-None-Match header against an entity tag
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+# function to serve a recommendation from the response cache, answering
+# conditional requests with 304 and computing and caching it on a miss
+async def cached_response(request: Request, endpoint, params, holder, compute):
+    params = normalize_params(params)
+    headers = {"Cache-Control": "no-cache"}
+    version = holder.version
+    if version is not None:
+        key = (endpoint, params, version)
+        headers["ETag"] = etag_for(key)
+        if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+            return Response(status_code=304, headers=headers)
+        body = response_cache.get(key)
+        if body is not None:
+            return json_response(body, headers)
+
+    data = await response_flight.do((endpoint, params, version), compute)
+    # compute returns either a payload or bytes serialized ahead of time
+    body = data if isinstance(data, bytes) else dumps(data)
+    computed_version = holder.version
+    # skip caching if a rebuild swapped the index while this one was computed
+    if version is None or version == computed_version:
+        key = (endpoint, params, computed_version)
+        headers["ETag"] = etag_for(key)
+        response_cache.set(key, body)
+    else:
+        del headers["ETag"]
+    return json_response(body, headers)
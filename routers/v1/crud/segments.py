@@ -0,0 +1,151 @@
+import hashlib
+import os
+
+import numpy as np
+from fastapi.concurrency import run_in_threadpool
+
+import metrics
+from models import TempSegment
+from routers.v1.crud import helper
+from routers.v1.crud.cache import TTLCache
+from routers.v1.crud.indexing import IndexHolder
+from routers.v1.crud.materialized import (
+    build_temp_recommendations,
+    fetch_temp_recommendation_version,
+    load_recommendation_inputs,
+    temp_recommendation_holder,
+)
+from routers.v1.crud.serialization import dumps
+from routers.v1.crud.singleflight import SingleFlight
+from routers.v1.crud.temp_store import TempFeatureStore, temp_store_holder
+
+# segment keys, in the order the (city, state, speciality, certificate) query
+# params are given
+SEGMENT_KEYS = ["city", "state", "speciality", "certification"]
+SEGMENT_CACHE_SIZE = int(os.getenv("SEGMENT_CACHE_SIZE", "10000"))
+SEGMENT_CACHE_TTL = int(os.getenv("SEGMENT_CACHE_TTL", "3600"))
+
+# (temp store version, badges, segment, members digest) -> badge rankings of
+# the segment, so a segment is re-ranked only once its own inputs change
+segment_cache = TTLCache(SEGMENT_CACHE_SIZE, SEGMENT_CACHE_TTL)
+metrics.register_cache("segment", segment_cache)
+# concurrent first requests for a segment share one ranking
+segment_flight = SingleFlight("temp segment")
+
+
+# Partition of the temp feature store by segment: each segment maps to the
+# temp store rows of its members, ranked per badge on first use
+class SegmentIndex:
+    def __init__(self, temp_store_version, temp_store, badges, computed_at, segments):
+        self.temp_store_version = temp_store_version
+        self.temp_store = temp_store
+        self.badges = tuple(badges)
+        # segment rankings report when their temp data was materialized, so a
+        # segment re-ranked after eviction serves the same body as before
+        self.computed_at = computed_at
+        # segment -> (member rows, digest of the rows)
+        self.segments = segments
+        # rankings of a segment without temps, every badge listing none
+        self.empty_temps_json = dumps({badge[0]: [] for badge in self.badges})
+
+    def __len__(self):
+        return len(self.segments)
+
+    # function to get the cache key of a segment's rankings, or None when the
+    # segment has no members
+    def cache_key(self, segment):
+        members = self.segments.get(segment)
+        if members is None:
+            return None
+        return self.temp_store_version, self.badges, segment, members[1]
+
+    # function to rank the members of a segment for every badge; page cursors
+    # are tied to the cache key, which only changes with the segment's data
+    def rank(self, segment):
+        rows = self.segments[segment][0]
+        temp_store = self.temp_store
+        members = TempFeatureStore(
+            temp_store.scaler, temp_store.matrix[rows], temp_store.tempids[rows]
+        )
+        return build_temp_recommendations(
+            (members, self.badges),
+            computed_at=self.computed_at,
+            version=self.cache_key(segment),
+        )
+
+
+# function to load the temp store, badge thresholds, the time the global badge
+# rankings were materialized and temp segments
+def load_segment_inputs(db):
+    computed_at = temp_recommendation_holder.get(db).computed_at
+    _, badges = load_recommendation_inputs(db)
+    temp_store_version, temp_store = temp_store_holder.current
+    columns = helper.fetch_segment_columns(db)
+    return temp_store_version, temp_store, badges, computed_at, columns
+
+
+# function to group the temp store rows of every segment's members
+def build_segment_index(inputs):
+    # pandas is imported on first build to keep boot fast
+    import pandas as pd
+
+    temp_store_version, temp_store, badges, computed_at, columns = inputs
+    frame = pd.DataFrame({key: columns[key] for key in SEGMENT_KEYS})
+    # tempid -> temp store row, -1 for temps missing from csv_data
+    frame["row"] = pd.Index(temp_store.tempids).get_indexer(
+        np.asarray(columns["tempid"]).astype(str)
+    )
+    frame = frame[frame["row"] >= 0]
+    segments = {}
+    for segment, rows in frame.groupby(SEGMENT_KEYS, sort=False)["row"]:
+        members = np.unique(rows.to_numpy(dtype=np.intp))
+        segments[segment] = (members, hashlib.sha1(members.tobytes()).hexdigest())
+    return SegmentIndex(temp_store_version, temp_store, badges, computed_at, segments)
+
+
+# function to get the badge rankings of one segment, computing them in the
+# threadpool on the segment's first request; None when it has no members
+async def segment_recommendations(segment_index, segment):
+    key = segment_index.cache_key(segment)
+    if key is None:
+        return None
+    recommendations = segment_cache.get(key)
+    if recommendations is not None:
+        return recommendations
+
+    async def compute():
+        recommendations = segment_cache.get(key)
+        if recommendations is None:
+            recommendations = await run_in_threadpool(segment_index.rank, segment)
+            segment_cache.set(key, recommendations)
+        return recommendations
+
+    return await segment_flight.do(key, compute)
+
+
+# function to get the combined change token of csv_data, badges and
+# temp_segments (None while that table is missing); it also covers when the
+# global rankings were materialized, which every temp response reports, so
+# response ETags of workers that computed them at different times never match
+def fetch_segment_version(db):
+    computed_at = temp_recommendation_holder.get(db).computed_at
+    segments_version = None
+    if helper.table_exists(db, TempSegment):
+        segments_version = helper.fetch_table_version(db, TempSegment)
+    return (
+        fetch_temp_recommendation_version(db),
+        computed_at.isoformat(),
+        segments_version,
+    )
+
+
+temp_segment_holder = IndexHolder(
+    "temp segment",
+    loader=load_segment_inputs,
+    builder=build_segment_index,
+    versioner=fetch_segment_version,
+    dependencies=[temp_recommendation_holder],
+)
+
+# regroup as soon as the refresher gets to it whenever temp data is rebuilt
+temp_store_holder.subscribe(temp_segment_holder.invalidate)
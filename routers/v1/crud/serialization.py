@@ -0,0 +1,17 @@
+import orjson
+from fastapi import Response
+
+# datetimes in UTC are written with a "Z" suffix, as pydantic does
+ORJSON_OPTIONS = orjson.OPT_UTC_Z
+
+
+# function to serialize a payload the server built itself straight to JSON
+# bytes, without re-validating it against the response model
+def dumps(payload):
+    return orjson.dumps(payload, option=ORJSON_OPTIONS)
+
+
+# function to return pre-serialized JSON bytes as-is; the route's
+# response_model still documents the shape in OpenAPI
+def json_response(body, headers=None):
+    return Response(body, media_type="application/json", headers=headers)
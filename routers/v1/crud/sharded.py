@@ -0,0 +1,157 @@
+import multiprocessing
+import os
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import date
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from logger import setup_logging
+from routers.v1.crud.shift_index import merge_top_k, score_batch
+
+logger = setup_logging()
+
+# processes scoring batch shift queries, each over a row shard of the matrix;
+# 0 or 1 keeps scoring in the request's thread
+SHIFT_SHARDS = int(os.getenv("SHIFT_SHARDS", "0"))
+
+# shard matrices this worker process has attached, by generation
+_attached = {}
+
+
+# function to copy an array into a new shared memory block, returning the
+# block and what a worker needs to map it
+def _share(array):
+    array = np.ascontiguousarray(array)
+    block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[:] = array
+    return block, (block.name, array.dtype.str, array.shape)
+
+
+# function to map a shared array in a worker without copying it
+def _attach(name, dtype, shape):
+    # spawned workers report to the parent's resource tracker, which already
+    # tracks the block, so attaching does not change who unlinks it
+    block = shared_memory.SharedMemory(name=name)
+    return block, np.ndarray(shape, dtype=dtype, buffer=block.buf)
+
+
+# function run in a worker: score queries against one shard and return the
+# local top-k of each query with rows offset to the whole matrix
+def score_shard(shard, query_matrix, ranges, k):
+    from scipy import sparse
+
+    generation, offset, shape, arrays = shard
+    key = (generation, offset)
+    if key not in _attached:
+        for stale in [name for name in _attached if name[0] != generation]:
+            blocks, matrix = _attached.pop(stale)
+            # the matrix views the blocks, so it goes before they close
+            del matrix
+            for block in blocks:
+                block.close()
+        blocks, (data, indices, indptr) = zip(*(_attach(*array) for array in arrays))
+        matrix = sparse.csr_matrix((data, indices, indptr), shape=shape, copy=False)
+        _attached[key] = (blocks, matrix)
+    matrix = _attached[key][1]
+    local_ranges = [
+        (max(low - offset, 0), min(high - offset, shape[0])) for low, high in ranges
+    ]
+    return [
+        (rows + offset, scores)
+        for rows, scores in score_batch(matrix, query_matrix, local_ranges, k)
+    ]
+
+
+# Scatter-gather scoring of batch shift queries: the shift matrix is split
+# row-wise into shards held in shared memory, a process pool computes a top-k
+# per shard and the parent merges them into the global top-k
+class ShardedShiftScorer:
+    def __init__(self, shards):
+        self.shards = shards
+        self._executor = None
+        self._lock = threading.Lock()
+        # index whose shards are shared, the shards, and their memory blocks
+        self._index = None
+        self._shards = []
+        self._blocks = []
+        # blocks of the previous index, kept until the next swap so batches
+        # still scoring it can finish
+        self._retired = []
+
+    # function to rank many queries across all shards, as search_batch would
+    def search_batch(self, shift_index, values_list, k=5, start=None, end=None):
+        if shift_index.vectorizer is None:
+            return [np.empty(0, dtype=np.intp) for _ in values_list]
+        executor, shards = self._shards_of(shift_index)
+        query_matrix = shift_index.vectorizer.transform(values_list)
+        ranges = shift_index.live_ranges(start or date.today(), end)
+        try:
+            futures = [
+                executor.submit(score_shard, shard, query_matrix, ranges, k)
+                for shard in shards
+            ]
+            results = [future.result() for future in futures]
+        except BrokenProcessPool:
+            # a crashed worker breaks the whole pool; start a fresh one next time
+            with self._lock:
+                if self._executor is executor:
+                    self._executor = None
+            raise
+        return [
+            merge_top_k([result[query] for result in results], k)[0]
+            for query in range(len(values_list))
+        ]
+
+    # function to get the pool and the shards of an index, sharing its matrix
+    # on first use
+    def _shards_of(self, shift_index):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.shards,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            if self._index is not shift_index:
+                self._reshard(shift_index)
+            return self._executor, self._shards
+
+    def _reshard(self, shift_index):
+        matrix = shift_index.matrix
+        generation = uuid.uuid4().hex
+        bounds = np.linspace(0, matrix.shape[0], self.shards + 1).astype(int)
+        shards, blocks = [], []
+        for low, high in zip(bounds[:-1], bounds[1:]):
+            shard = matrix[low:high]
+            arrays = []
+            for array in (shard.data, shard.indices, shard.indptr):
+                block, descriptor = _share(array)
+                blocks.append(block)
+                arrays.append(descriptor)
+            shards.append((generation, int(low), shard.shape, arrays))
+        self._unlink(self._retired)
+        self._retired = self._blocks
+        self._index, self._shards, self._blocks = shift_index, shards, blocks
+        logger.info(
+            "Shared %s shift index rows across %s shards", matrix.shape[0], self.shards
+        )
+
+    def _unlink(self, blocks):
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+    # function to stop the workers and free every shared block
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+            self._unlink(self._retired + self._blocks)
+            self._index, self._shards, self._blocks, self._retired = None, [], [], []
+
+
+shift_scorer = ShardedShiftScorer(SHIFT_SHARDS) if SHIFT_SHARDS > 1 else None
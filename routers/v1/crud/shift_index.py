@@ -0,0 +1,293 @@
+import os
+from datetime import date, timedelta
+from functools import reduce
+
+import numpy as np
+
+from models import ShiftData
+from routers.v1.crud import helper, snapshots
+from routers.v1.crud.indexing import IndexHolder
+
+# shifts_table attributes matched by the recommender, in query order
+SHIFT_COLUMNS = ["speciality", "certification", "city", "state"]
+# days of upcoming shifts scored when a request sets no window, 0 for all
+SHIFT_WINDOW_DAYS = int(os.getenv("SHIFT_WINDOW_DAYS", "0"))
+
+
+# function to turn a row of attribute values into field-qualified tokens, so
+# UUID values are matched whole and per attribute instead of as free text
+def shift_tokens(values):
+    return [
+        f"{column}={value}"
+        for column, value in zip(SHIFT_COLUMNS, values)
+        if value is not None
+    ]
+
+
+# function to get the [start, end) dates of the upcoming shifts a request
+# scores; end is None when every upcoming shift is scored
+def upcoming_window(days=None):
+    start = date.today()
+    days = days or SHIFT_WINDOW_DAYS
+    return start, start + timedelta(days=days) if days else None
+
+
+# TF-IDF model over shift attributes plus an inverted index of its columns
+class ShiftIndex:
+    def __init__(self, vectorizer, matrix, ids, dates, long_term, postings=None):
+        self.vectorizer = vectorizer
+        self.matrix = matrix
+        self.ids = ids
+        # rows are ordered by date with undated shifts last, so each day is a
+        # contiguous partition of the rows and of every sorted posting list
+        self.dates = dates
+        self.long_term = long_term
+        self.undated_from = len(dates) - int(np.count_nonzero(np.isnat(dates)))
+        # column-major copy of the matrix: each column is the sorted posting
+        # list of row positions holding that attribute value
+        if postings is None:
+            postings = matrix.tocsc()
+            postings.sort_indices()
+        self.postings = postings
+        self.idf = np.empty(0) if vectorizer is None else np.asarray(vectorizer.idf_)
+
+    def __len__(self):
+        return len(self.ids)
+
+    # function to get the row positions of shifts with the given attribute value
+    def posting_list(self, column, value):
+        token = self.vectorizer.vocabulary_.get(f"{column}={value}")
+        if token is None:
+            return np.empty(0, dtype=self.postings.indices.dtype)
+        start, end = self.postings.indptr[token], self.postings.indptr[token + 1]
+        return self.postings.indices[start:end]
+
+    # function to get the row ranges of the partitions dated from start up to
+    # (not including) end, plus the undated shifts which are always open
+    def live_ranges(self, start, end=None):
+        dated = self.dates[: self.undated_from]
+        low = int(np.searchsorted(dated, np.datetime64(start, "D")))
+        high = self.undated_from
+        if end is not None:
+            high = max(low, int(np.searchsorted(dated, np.datetime64(end, "D"))))
+        return [(low, high), (self.undated_from, len(self.dates))]
+
+    # function to get the positions in the postings arrays of a token's rows
+    # within row ranges, found by bisecting its sorted posting list
+    def _postings_within(self, token, ranges, long_term=None):
+        start, end = self.postings.indptr[token], self.postings.indptr[token + 1]
+        rows = self.postings.indices[start:end]
+        positions = np.concatenate(
+            [
+                np.arange(
+                    start + np.searchsorted(rows, low),
+                    start + np.searchsorted(rows, high),
+                )
+                for low, high in ranges
+            ]
+        )
+        if long_term is not None:
+            rows = self.postings.indices[positions]
+            positions = positions[self.long_term[rows] == long_term]
+        return positions
+
+    # function to get the vocabulary positions of a query's tokens and their
+    # l2-normalized tf-idf weights, as vectorizer.transform would compute them
+    def query_weights(self, values):
+        vocabulary = self.vectorizer.vocabulary_
+        tokens = np.array(
+            [
+                vocabulary[token]
+                for token in shift_tokens(values)
+                if token in vocabulary
+            ],
+            dtype=np.intp,
+        )
+        # every token occurs once per query, so its tf-idf weight is its idf
+        weights = self.idf[tokens]
+        norm = np.sqrt(weights @ weights)
+        return tokens, weights / norm if norm else weights
+
+    # function to rank the shift rows dated within [start, end) for attribute
+    # values by cosine similarity, keeping the best depth rows with ties broken
+    # by row order, i.e. sooner shifts first; start defaults to today and rows
+    # outside the window or long-term filter are never scored
+    def rank(self, values, depth, start=None, end=None, long_term=None):
+        if self.vectorizer is None or depth <= 0:
+            return np.empty(0, dtype=np.intp), np.empty(0)
+        ranges = self.live_ranges(start or date.today(), end)
+        tokens, weights = self.query_weights(values)
+        positions = [
+            self._postings_within(token, ranges, long_term) for token in tokens
+        ]
+        posting_lists = [self.postings.indices[p] for p in positions]
+
+        # exact matches hold every query token, so they share the top score
+        # (the query's own norm) and nothing else needs scoring when enough
+        if len(tokens) == len(SHIFT_COLUMNS):
+            exact = reduce(
+                lambda a, b: np.intersect1d(a, b, assume_unique=True),
+                sorted(posting_lists, key=len),
+            )
+            if len(exact) >= depth:
+                return exact[:depth], np.full(depth, weights @ weights)
+
+        # ranked fallback: accumulate the query weight of every posting the
+        # union of the lists holds, straight from the column-major postings
+        if not posting_lists:
+            return np.empty(0, dtype=np.intp), np.empty(0)
+        rows = np.concatenate(posting_lists)
+        contributions = np.concatenate(
+            [self.postings.data[p] * weight for p, weight in zip(positions, weights)]
+        )
+        candidates, inverse = np.unique(rows, return_inverse=True)
+        scores = np.bincount(inverse, weights=contributions)
+        top = top_k_largest(scores, depth)
+        return candidates[top], scores[top]
+
+    # function to find the best matching shift rows for attribute values
+    def search(self, values, k=5, start=None, end=None, long_term=None):
+        return self.rank(values, k, start, end, long_term)[0]
+
+    # function to rank many queries with one sparse matrix product per live
+    # range of rows
+    def search_batch(self, values_list, k=5, start=None, end=None):
+        if self.vectorizer is None:
+            return [np.empty(0, dtype=np.intp) for _ in values_list]
+        query_matrix = self.vectorizer.transform(values_list)
+        ranges = self.live_ranges(start or date.today(), end)
+        return [rows for rows, _ in score_batch(self.matrix, query_matrix, ranges, k)]
+
+
+# function to score queries against the rows of a matrix within row ranges,
+# keeping the (rows, scores) of the k best per query, ties broken by row
+def score_batch(matrix, query_matrix, ranges, k):
+    parts = []
+    for low, high in ranges:
+        if high > low:
+            # queries x shifts, non-zero only where a shift shares an attribute
+            scores = (query_matrix @ matrix[low:high].T).tocsr()
+            scores.sort_indices()
+            parts.append((low, scores))
+    results = []
+    for row in range(query_matrix.shape[0]):
+        rows = [
+            scores.indices[scores.indptr[row] : scores.indptr[row + 1]] + low
+            for low, scores in parts
+        ]
+        data = [
+            scores.data[scores.indptr[row] : scores.indptr[row + 1]]
+            for _, scores in parts
+        ]
+        rows = np.concatenate(rows) if rows else np.empty(0, dtype=np.intp)
+        data = np.concatenate(data) if data else np.empty(0)
+        top = top_k_largest(data, k)
+        results.append((rows[top], data[top]))
+    return results
+
+
+# function to merge per-shard (rows, scores) top-k lists into the global top-k,
+# best first with ties broken by row as in a single unsharded ranking
+def merge_top_k(parts, k):
+    rows = np.concatenate([rows for rows, _ in parts])
+    scores = np.concatenate([scores for _, scores in parts])
+    order = np.lexsort((rows, -scores))[:k]
+    return rows[order], scores[order]
+
+
+# function to get the positions of the k highest scores, best first with ties
+# broken by position, partially sorting only the entries that can qualify
+def top_k_largest(scores, k):
+    if k < len(scores):
+        threshold = np.partition(scores, len(scores) - k)[len(scores) - k]
+        positions = np.flatnonzero(scores >= threshold)
+    else:
+        positions = np.arange(len(scores))
+    order = np.lexsort((positions, -scores[positions]))[:k]
+    return positions[order]
+
+
+# function to fit the shift index from shift columns, partitioned by date
+def build_shift_index(columns):
+    # scipy and scikit-learn are imported on first build to keep boot fast
+    from scipy import sparse
+    from sklearn.feature_extraction.text import TfidfVectorizer
+
+    dates = np.asarray(columns["date"], dtype="datetime64[D]")
+    # stable, so rows of one day keep their table order; NaT sorts last
+    order = np.argsort(dates, kind="stable")
+    ids = np.asarray(columns["id"]).astype(str)[order]
+    dates = dates[order]
+    long_term = np.asarray(columns["is_long_term"], dtype=bool)[order]
+    if not len(ids):
+        return ShiftIndex(None, sparse.csr_matrix((0, 0)), ids, dates, long_term)
+    vectorizer = TfidfVectorizer(analyzer=shift_tokens)
+    matrix = vectorizer.fit_transform(
+        zip(
+            *(
+                np.asarray(columns[column], dtype=object)[order].tolist()
+                for column in SHIFT_COLUMNS
+            )
+        )
+    )
+    return ShiftIndex(vectorizer, matrix, ids, dates, long_term)
+
+
+# function to write the shift index as memory-mappable arrays
+def save_shift_index(shift_index, path):
+    tokens = np.empty(0, dtype=object)
+    idf = np.empty(0)
+    if shift_index.vectorizer is not None:
+        vocabulary = shift_index.vectorizer.vocabulary_
+        tokens = np.empty(len(vocabulary), dtype=object)
+        for token, position in vocabulary.items():
+            tokens[position] = token
+        idf = shift_index.vectorizer.idf_
+    snapshots.save_arrays(
+        path,
+        ids=shift_index.ids,
+        dates=shift_index.dates,
+        long_term=shift_index.long_term,
+        tokens=tokens,
+        idf=idf,
+    )
+    snapshots.save_sparse(path, "matrix", shift_index.matrix)
+    snapshots.save_sparse(path, "postings", shift_index.postings)
+
+
+# function to open a shift index snapshot without copying its matrices
+def load_shift_index(path):
+    from sklearn.feature_extraction.text import TfidfVectorizer
+
+    ids, dates, long_term, tokens, idf = snapshots.load_arrays(
+        path, "ids", "dates", "long_term", "tokens", "idf"
+    )
+    vectorizer = None
+    if len(tokens):
+        vectorizer = TfidfVectorizer(analyzer=shift_tokens)
+        vectorizer.vocabulary_ = {str(token): i for i, token in enumerate(tokens)}
+        vectorizer.idf_ = np.array(idf)
+    return ShiftIndex(
+        vectorizer,
+        snapshots.load_sparse(path, "matrix"),
+        ids,
+        dates,
+        long_term,
+        postings=snapshots.load_sparse(path, "postings", "csc"),
+    )
+
+
+# function to get the change token of shifts_table; it also moves every day, so
+# the refresher rebuilds the index without the partitions that expired
+def fetch_shift_index_version(db):
+    return helper.fetch_table_version(db, ShiftData) + (date.today().isoformat(),)
+
+
+shift_index_holder = IndexHolder(
+    "shift",
+    loader=helper.fetch_shift_columns,
+    builder=build_shift_index,
+    versioner=fetch_shift_index_version,
+    saver=save_shift_index,
+    opener=load_shift_index,
+)
@@ -0,0 +1,58 @@
+import asyncio
+import os
+
+from fastapi import HTTPException
+
+import metrics
+
+# seconds a caller waits on an identical in-flight computation before a 503
+SINGLE_FLIGHT_TIMEOUT = int(os.getenv("SINGLE_FLIGHT_TIMEOUT", "30"))
+
+
+# Coalesces concurrent calls with the same key into one in-flight computation:
+# the first caller runs it, later callers await its result or exception
+class SingleFlight:
+    def __init__(self, name, timeout=SINGLE_FLIGHT_TIMEOUT):
+        self.name = name
+        self.timeout = timeout
+        self._calls = {}
+
+    def __len__(self):
+        return len(self._calls)
+
+    # function to run compute once for all concurrent callers with the key
+    async def do(self, key, compute):
+        while key in self._calls:
+            future = self._calls[key]
+            metrics.SINGLE_FLIGHT_CALLS.inc(flight=self.name, role="follower")
+            try:
+                return await asyncio.wait_for(asyncio.shield(future), self.timeout)
+            except asyncio.TimeoutError:
+                metrics.SINGLE_FLIGHT_CALLS.inc(flight=self.name, role="timeout")
+                raise HTTPException(
+                    status_code=503,
+                    detail="Recommendations are still being computed",
+                    headers={"Retry-After": "1"},
+                )
+            except asyncio.CancelledError:
+                # the leader's request went away; retry, leading if no one else
+                if not future.cancelled():
+                    raise
+        metrics.SINGLE_FLIGHT_CALLS.inc(flight=self.name, role="leader")
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        try:
+            result = await compute()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # mark it retrieved, so asyncio does not log a failure nobody awaited
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._calls[key]
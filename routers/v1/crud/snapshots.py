@@ -0,0 +1,123 @@
+import json
+import os
+import shutil
+from datetime import datetime, timezone
+
+import numpy as np
+
+INDEX_SNAPSHOT_DIR = os.getenv("INDEX_SNAPSHOT_DIR", "snapshots")
+VERSION_FILE = "version.json"
+# written last, so only complete snapshot directories carry one
+MANIFEST_FILE = "manifest.json"
+
+
+# function to write arrays as .npy files that workers can memory-map; object
+# arrays are converted to fixed-width unicode since they cannot be mapped
+def save_arrays(path, **arrays):
+    os.makedirs(path, exist_ok=True)
+    for name, array in arrays.items():
+        array = np.asarray(array)
+        if array.dtype == object:
+            array = array.astype(str)
+        np.save(os.path.join(path, f"{name}.npy"), array, allow_pickle=False)
+
+
+# function to open .npy files read-only through mmap, so every worker process
+# maps the same page-cache copy instead of holding its own
+def load_arrays(path, *names):
+    return [
+        np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r", allow_pickle=False)
+        for name in names
+    ]
+
+
+# function to write the CSR/CSC components of a sparse matrix
+def save_sparse(path, name, matrix):
+    save_arrays(
+        path,
+        **{
+            f"{name}_data": matrix.data,
+            f"{name}_indices": matrix.indices,
+            f"{name}_indptr": matrix.indptr,
+            f"{name}_shape": np.asarray(matrix.shape, dtype=np.int64),
+        },
+    )
+
+
+# function to rebuild a sparse matrix over memory-mapped components
+def load_sparse(path, name, matrix_format="csr"):
+    from scipy import sparse
+
+    matrix_type = sparse.csc_matrix if matrix_format == "csc" else sparse.csr_matrix
+    data, indices, indptr, shape = load_arrays(
+        path, f"{name}_data", f"{name}_indices", f"{name}_indptr", f"{name}_shape"
+    )
+    return matrix_type((data, indices, indptr), shape=tuple(shape), copy=False)
+
+
+# function to turn JSON lists back into the tuples table versions are made of
+def _as_tuple(value):
+    if isinstance(value, list):
+        return tuple(_as_tuple(item) for item in value)
+    return value
+
+
+def save_version(path, version):
+    with open(os.path.join(path, VERSION_FILE), "w") as version_file:
+        json.dump(version, version_file)
+
+
+def load_version(path):
+    with open(os.path.join(path, VERSION_FILE)) as version_file:
+        return _as_tuple(json.load(version_file))
+
+
+# function to name a new snapshot directory; names sort chronologically
+def new_snapshot_name():
+    return datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+
+
+def write_manifest(path, name, versions):
+    with open(os.path.join(path, MANIFEST_FILE), "w") as manifest_file:
+        json.dump(
+            {
+                "snapshot": name,
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "indexes": versions,
+            },
+            manifest_file,
+        )
+
+
+def read_manifest(path):
+    with open(os.path.join(path, MANIFEST_FILE)) as manifest_file:
+        manifest = json.load(manifest_file)
+    manifest["indexes"] = {
+        name: _as_tuple(version) for name, version in manifest["indexes"].items()
+    }
+    return manifest
+
+
+# function to list complete snapshot directories under root, oldest first
+def list_snapshots(root):
+    if not os.path.isdir(root):
+        return []
+    return [
+        os.path.join(root, name)
+        for name in sorted(os.listdir(root))
+        if not name.startswith(".")
+        and os.path.isfile(os.path.join(root, name, MANIFEST_FILE))
+    ]
+
+
+# function to get the newest complete snapshot directory, or None
+def latest_snapshot(root):
+    paths = list_snapshots(root)
+    return paths[-1] if paths else None
+
+
+# function to delete all but the newest snapshots; workers that still map an
+# older one keep reading it until they reload, as unlinked files stay mapped
+def prune_snapshots(root, keep):
+    for path in list_snapshots(root)[:-keep]:
+        shutil.rmtree(path, ignore_errors=True)
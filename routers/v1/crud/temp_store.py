@@ -0,0 +1,134 @@
+import numpy as np
+
+from models import TempData
+from routers.v1.crud import helper, snapshots
+from routers.v1.crud.indexing import IndexHolder
+from routers.v1.crud.knn import KNNIndex
+
+NUMERICAL_FEATURES = ["attendance_score", "on_time_rate"]
+
+
+# Min-max scaled temp feature matrix, shared read-only by all requests
+class TempFeatureStore:
+    def __init__(self, scaler, matrix, tempids):
+        self.scaler = scaler
+        self.matrix = matrix
+        self.tempids = tempids
+        self._knn_indexes = {}
+
+    def __len__(self):
+        return len(self.tempids)
+
+    # function to get the kNN index for a metric, built on first use
+    def knn_index(self, metric):
+        knn_index = self._knn_indexes.get(metric)
+        if knn_index is None:
+            knn_index = KNNIndex(self.matrix, metric)
+            self._knn_indexes[metric] = knn_index
+        return knn_index
+
+
+# function to fit the scaler and build the feature matrix from temp columns
+def build_temp_store(columns):
+    # scikit-learn is imported on first build to keep boot fast
+    from sklearn.preprocessing import MinMaxScaler
+
+    scaler = MinMaxScaler()
+    matrix = scaler.fit_transform(
+        np.column_stack(
+            [
+                np.asarray(columns[feature], dtype=float)
+                for feature in NUMERICAL_FEATURES
+            ]
+        )
+    )
+    tempids = np.asarray(columns["tempid"]).astype(str)
+    return TempFeatureStore(scaler, matrix, tempids)
+
+
+# function to rank similar temps for many inputs with a single kNN query,
+# returning the tempids and distances of each input's k nearest temps
+def rank_temps_batch(input_data_list, temp_store, metric="cosine", k=5):
+    if not input_data_list:
+        return []
+    # Normalize input data with the scaler fitted on the temp features
+    input_array = np.array(
+        [
+            [input_data[feature] for feature in NUMERICAL_FEATURES]
+            for input_data in input_data_list
+        ],
+        dtype=float,
+    )
+    input_array = temp_store.scaler.transform(input_array)
+    temp_indices, distances = temp_store.knn_index(metric).query(input_array, k)
+    return [
+        ([str(x) for x in temp_store.tempids[row]], row_distances.tolist())
+        for row, row_distances in zip(temp_indices, distances)
+    ]
+
+
+# function to find similar temps for many inputs with a single kNN query
+def recommend_temps_batch(input_data_list, temp_store, metric="cosine", k=5):
+    return [
+        tempids
+        for tempids, _ in rank_temps_batch(input_data_list, temp_store, metric, k)
+    ]
+
+
+# function to find similar temps and return list of temps
+def recommend_temps(input_data, temp_store, metric="cosine", k=5):
+    return recommend_temps_batch([input_data], temp_store, metric=metric, k=k)[0]
+
+
+# function to write the feature matrix and fitted scaler as memory-mappable arrays
+def save_temp_store(temp_store, path):
+    scaler = temp_store.scaler
+    snapshots.save_arrays(
+        path,
+        matrix=temp_store.matrix,
+        tempids=temp_store.tempids,
+        scaler_min=scaler.min_,
+        scaler_scale=scaler.scale_,
+        scaler_data_min=scaler.data_min_,
+        scaler_data_max=scaler.data_max_,
+    )
+
+
+# function to open a temp feature store snapshot without copying its matrix
+def load_temp_store(path):
+    from sklearn.preprocessing import MinMaxScaler
+
+    matrix, tempids, scaler_min, scale, data_min, data_max = snapshots.load_arrays(
+        path,
+        "matrix",
+        "tempids",
+        "scaler_min",
+        "scaler_scale",
+        "scaler_data_min",
+        "scaler_data_max",
+    )
+    # restore the fitted attributes MinMaxScaler.transform relies on
+    scaler = MinMaxScaler()
+    scaler.min_ = np.array(scaler_min)
+    scaler.scale_ = np.array(scale)
+    scaler.data_min_ = np.array(data_min)
+    scaler.data_max_ = np.array(data_max)
+    scaler.data_range_ = scaler.data_max_ - scaler.data_min_
+    scaler.n_features_in_ = len(scaler.min_)
+    scaler.n_samples_seen_ = len(tempids)
+    return TempFeatureStore(scaler, matrix, tempids)
+
+
+# function to get the change token of csv_data
+def fetch_temp_store_version(db):
+    return helper.fetch_table_version(db, TempData)
+
+
+temp_store_holder = IndexHolder(
+    "temp",
+    loader=helper.fetch_temps_columns,
+    builder=build_temp_store,
+    versioner=fetch_temp_store_version,
+    saver=save_temp_store,
+    opener=load_temp_store,
+)
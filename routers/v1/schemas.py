@@ -1,7 +1,15 @@
+from datetime import datetime
+from typing import Optional
+
 from email_validator import EmailNotValidError, validate_email
 from fastapi import HTTPException, status
 from pydantic import BaseModel, Field, field_validator
 
+MAX_BATCH_SIZE = 1000
+DEFAULT_PAGE_SIZE = 5
+MAX_PAGE_SIZE = 100
+MAX_SHIFT_WINDOW_DAYS = 365
+
 
 # Pydantic model for user credentials
 class Login(BaseModel):
@@ -39,6 +47,10 @@ class TempRecommendationsSchema(BaseModel):
 
 class TempsDataRecommendation(BaseModel):
     temps: TempRecommendationsSchema
+    # badge -> distance of each temp to the badge thresholds, closest first
+    distances: Optional[dict[str, list[float]]] = None
+    computed_at: Optional[datetime] = None
+    next_cursor: Optional[str] = None
 
 
 class TempRecommendations(BaseModel):
@@ -48,6 +60,9 @@ class TempRecommendations(BaseModel):
 # shift recommendation response model
 class ShiftRecommendationSchema(BaseModel):
     shift: list = Field(alias="shift")
+    # cosine similarity of each shift to the query, best first
+    scores: Optional[list[float]] = None
+    next_cursor: Optional[str] = None
 
     class Config:
         allow_population_by_field_name = True
@@ -55,3 +70,36 @@ class ShiftRecommendationSchema(BaseModel):
 
 class ShiftDataRecommendations(BaseModel):
     data: ShiftRecommendationSchema
+
+
+# batch recommendation request model
+class RecommendationQuery(BaseModel):
+    city: str = Field(min_length=36, max_length=36)
+    state: str = Field(min_length=36, max_length=36)
+    speciality: str = Field(min_length=36, max_length=36)
+    certificate: str = Field(min_length=36, max_length=36)
+
+
+class BatchRecommendationRequest(BaseModel):
+    queries: list[RecommendationQuery] = Field(min_length=1, max_length=MAX_BATCH_SIZE)
+
+
+# batch temps recommendations response model
+class TempBatchRecommendation(BaseModel):
+    query: RecommendationQuery
+    temps: TempRecommendationsSchema
+
+
+class TempBatchRecommendations(BaseModel):
+    data: list[TempBatchRecommendation]
+    computed_at: Optional[datetime] = None
+
+
+# batch shift recommendations response model
+class ShiftBatchRecommendation(BaseModel):
+    query: RecommendationQuery
+    shift: list
+
+
+class ShiftBatchRecommendations(BaseModel):
+    data: list[ShiftBatchRecommendation]
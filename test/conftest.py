@@ -0,0 +1,84 @@
+import importlib
+import json
+import sys
+from datetime import date
+
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+
+API_SEED_SIZE = 1000
+API_JWT_KEY = "api-test-secret"
+
+
+# App served over a seeded SQLite file through aiosqlite, with a client, a
+# valid bearer token and the attribute values of one upcoming seeded shift
+@pytest.fixture(scope="session")
+def api(tmp_path_factory):
+    from fastapi.testclient import TestClient
+    from jose import jwt
+
+    tmp_path = tmp_path_factory.mktemp("api")
+    database = tmp_path / "api.db"
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        # database.py reads the URLs on first import, so they are set before
+        # main is imported
+        monkeypatch.setenv("FA_DB_URL", f"sqlite:///{database}")
+        monkeypatch.setenv("FA_ASYNC_DB_URL", f"sqlite+aiosqlite:///{database}")
+        if importlib.util.find_spec("config") is None:
+            # checkouts without a config.py run on the template, as a fresh
+            # deploy does
+            monkeypatch.setenv("FA_TITLE", "Recommender system APIs")
+            monkeypatch.setenv("FA_JWT_KEY", json.dumps(API_JWT_KEY))
+            monkeypatch.setitem(
+                sys.modules, "config", importlib.import_module("config_template")
+            )
+        # imported by absolute name, as uvicorn does, so the fixture and the
+        # app share one copy of every module
+        main = importlib.import_module("main")
+        if main.engine.url.database != str(database):
+            pytest.skip("the app was already imported against another database")
+
+        from benchmarks.recommenders import seed_database
+        from models import ShiftData
+
+        engine = create_engine(f"sqlite:///{database}")
+        values = seed_database(engine, API_SEED_SIZE)
+        with Session(engine) as db:
+            shift = db.scalars(
+                select(ShiftData).where(ShiftData.date >= date.today()).limit(1)
+            ).first()
+        engine.dispose()
+
+        token = jwt.encode({"email": "tester@gmail.com"}, main.config.JWT_KEY)
+        # indexes and caches are process-wide and other tests fill them
+        monkeypatch.setattr(main, "INDEX_SNAPSHOT_DIR", str(tmp_path / "snapshots"))
+        for holder in main.REFRESHED_HOLDERS:
+            monkeypatch.setattr(holder, "_current", None)
+        for cache in caches():
+            cache.clear()
+        with TestClient(main.app) as client:
+            yield {
+                "client": client,
+                "main": main,
+                "admission": importlib.import_module("dependencies").db_admission,
+                "headers": {"authorization": f"Bearer {token}"},
+                "values": values,
+                "shift": {
+                    "city": shift.city,
+                    "state": shift.state,
+                    "speciality": shift.speciality,
+                    "certificate": shift.certification,
+                },
+            }
+        for cache in caches():
+            cache.clear()
+
+
+# function to get the response, ranking and segment caches the app serves from
+def caches():
+    from routers.v1.crud.pagination import ranking_cache
+    from routers.v1.crud.response_cache import response_cache
+    from routers.v1.crud.segments import segment_cache
+
+    return [response_cache, ranking_cache, segment_cache]
@@ -0,0 +1,73 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+from ..routers.v1.crud.admission import AdmissionController, database_slot
+
+
+# Test case 1: requests past the limit queue in order and the rest are shed
+def test_admission_queues_then_sheds():
+    admission = AdmissionController("test-queue", limit=1, queue_size=1, timeout=1)
+    order = []
+
+    async def request(name, hold):
+        async with admission.admit("test"):
+            order.append(name)
+            await hold.wait()
+
+    async def run():
+        first_done, second_done = asyncio.Event(), asyncio.Event()
+        first = asyncio.ensure_future(request("first", first_done))
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(request("second", second_done))
+        await asyncio.sleep(0)
+        assert (admission.active, admission.queued) == (1, 1)
+
+        with pytest.raises(HTTPException) as shed:
+            await request("third", asyncio.Event())
+        assert shed.value.status_code == 503
+        assert shed.value.headers["Retry-After"] == "1"
+
+        first_done.set()
+        second_done.set()
+        await asyncio.gather(first, second)
+
+    asyncio.run(run())
+    assert order == ["first", "second"]
+    assert (admission.active, admission.queued) == (0, 0)
+
+
+# Test case 2: a queued request is shed once its wait times out
+def test_admission_wait_times_out():
+    admission = AdmissionController("test-timeout", limit=1, queue_size=5, timeout=0)
+
+    async def run():
+        async with admission.admit("test"):
+            with pytest.raises(HTTPException):
+                async with admission.admit("test"):
+                    pass
+        assert (admission.active, admission.queued) == (0, 0)
+
+    asyncio.run(run())
+
+
+# Test case 3: sessions of different routes draw on one budget, and sessions
+# opened without admission control never wait
+def test_database_slot_shares_one_budget_across_routes():
+    admission = AdmissionController("test-shared", limit=1, queue_size=0, timeout=1)
+    auth = SimpleNamespace(info={"admission": (admission, "auth")})
+    recommend = SimpleNamespace(info={"admission": (admission, "recommend-temp")})
+
+    async def run():
+        async with database_slot(auth):
+            assert admission.active == 1
+            with pytest.raises(HTTPException):
+                async with database_slot(recommend):
+                    pass
+            async with database_slot(SimpleNamespace(info={})):
+                pass
+        assert admission.active == 0
+
+    asyncio.run(run())
@@ -0,0 +1,26 @@
+import pytest
+from sqlalchemy import create_engine
+
+from ..benchmarks.recommenders import run_benchmarks, seed_database
+
+
+def test_run_benchmarks_reports_every_stage():
+    report = run_benchmarks([200], measure_memory=False)
+    assert report["database"] == "sqlite"
+    (result,) = report["results"]
+    assert result["size"] == 200
+    assert set(result["temp_recommender"]) == {"fetch", "scale", "score", "serialize"}
+    assert set(result["shift_recommender"]) == {
+        "fetch",
+        "vectorize",
+        "score",
+        "score_batch",
+        "serialize",
+    }
+    assert result["shift_recommender"]["score"]["queries_per_second"] > 0
+
+
+def test_seed_database_refuses_to_drop_other_databases():
+    engine = create_engine("postgresql+psycopg2://user@localhost/recommender")
+    with pytest.raises(ValueError, match="--allow-drop"):
+        seed_database(engine, 10)
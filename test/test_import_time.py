@@ -0,0 +1,52 @@
+import os
+import shutil
+import subprocess
+import sys
+
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# cumulative import time of `main`, about 1.3s on a developer laptop where
+# fastapi and its pydantic/email-validator models take ~0.75s of it
+IMPORT_TIME_BUDGET_MS = int(os.getenv("IMPORT_TIME_BUDGET_MS", "2500"))
+# imported on first use or during the startup warmup, never by `import main`
+DEFERRED_MODULES = ("pandas", "sklearn", "scipy", "passlib")
+
+
+# function to import a module in a fresh interpreter with -X importtime and
+# return {module: cumulative microseconds}
+def measure_import_time(module, tmp_path):
+    shutil.copy(os.path.join(PACKAGE_DIR, "config_template.py"), tmp_path / "config.py")
+    database_url = tmp_path / "import_time.db"
+    env = dict(
+        os.environ,
+        PYTHONPATH=os.pathsep.join([str(tmp_path), PACKAGE_DIR]),
+        FA_TITLE="Recommender system APIs",
+        FA_DB_URL=f"sqlite:///{database_url}",
+        FA_ASYNC_DB_URL=f"sqlite+aiosqlite:///{database_url}",
+    )
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=tmp_path,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    timings = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        timings[name.strip()] = int(cumulative)
+    return timings
+
+
+def test_main_import_time_within_budget(tmp_path):
+    timings = measure_import_time("main", tmp_path)
+
+    # Test case 1: heavy libraries are not imported with the app
+    eager = [name for name in timings if name.split(".")[0] in DEFERRED_MODULES]
+    assert eager == []
+
+    # Test case 2: the whole import stays within the tracked budget
+    assert timings["main"] / 1000 < IMPORT_TIME_BUDGET_MS
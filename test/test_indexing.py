@@ -0,0 +1,238 @@
+import io
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from ..models import Base, TempData
+from ..routers.v1.crud.helper import (
+    SHIFT_COLUMNS,
+    TEMP_COLUMNS,
+    fetch_columns,
+    fetch_table_version,
+    read_copy_csv,
+)
+from ..routers.v1.crud.indexing import IndexHolder
+from ..routers.v1.crud.shift_index import build_shift_index
+from ..routers.v1.crud.temp_store import build_temp_store
+
+TODAY = date.today()
+
+
+def make_holder(state):
+    def loader(db):
+        state["loads"] += 1
+        return state["rows"]
+
+    return IndexHolder(
+        "test",
+        loader=loader,
+        builder=lambda rows: list(rows),
+        versioner=lambda db: state["version"],
+    )
+
+
+def test_index_holder_builds_once_and_swaps_on_version_change():
+    state = {"loads": 0, "rows": [1, 2], "version": 1}
+    holder = make_holder(state)
+
+    # Test case 1: first get builds, later gets reuse the same index
+    first = holder.get(None)
+    assert first == [1, 2]
+    assert holder.get(None) is first
+    assert state["loads"] == 1
+
+    # Test case 2: refresh is a no-op while the version is unchanged
+    holder.refresh(None)
+    assert state["loads"] == 1
+
+    # Test case 3: a new version swaps in a rebuilt index
+    state["rows"], state["version"] = [3], 2
+    holder.refresh(None)
+    assert holder.get(None) == [3]
+    assert holder.version == 2
+
+    # Test case 4: invalidate forces the next refresh to rebuild
+    holder.invalidate()
+    holder.refresh(None)
+    assert state["loads"] == 3
+
+
+def make_shift_df():
+    return pd.DataFrame(
+        {
+            "id": ["s1", "s2", "s3", "s4"],
+            "city": ["c1", "c1", "c2", "c1"],
+            "state": ["st1", "st1", "st2", "st1"],
+            "speciality": ["sp1", "sp2", "sp1", "sp1"],
+            "certification": ["ce1", "ce1", "ce2", "ce1"],
+            "date": [TODAY + timedelta(days=day) for day in range(4)],
+            "is_long_term": [False, True, False, False],
+        }
+    )
+
+
+def test_build_shift_index():
+    shift_index = build_shift_index(make_shift_df())
+    assert len(shift_index) == 4
+    assert shift_index.matrix.shape[0] == 4
+    assert list(shift_index.ids) == ["s1", "s2", "s3", "s4"]
+    assert shift_index.posting_list("city", "c1").tolist() == [0, 1, 3]
+    assert shift_index.posting_list("city", "unknown").tolist() == []
+
+
+def test_shift_index_search():
+    shift_index = build_shift_index(make_shift_df())
+
+    # Test case 1: exact matches are returned from the posting list intersection
+    rows = shift_index.search(("sp1", "ce1", "c1", "st1"), k=2)
+    assert shift_index.ids[rows].tolist() == ["s1", "s4"]
+
+    # Test case 2: partial matches are ranked after exact matches
+    rows = shift_index.search(("sp1", "ce1", "c1", "st1"), k=5)
+    assert shift_index.ids[rows].tolist() == ["s1", "s4", "s2", "s3"]
+
+    # Test case 3: values are matched per attribute, not as free text
+    rows = shift_index.search(("c1", "ce9", "sp1", "st9"), k=5)
+    assert shift_index.ids[rows].tolist() == []
+
+    # Test case 4: an empty table yields no matches
+    empty_index = build_shift_index(make_shift_df().iloc[:0])
+    assert len(empty_index.search(("sp1", "ce1", "c1", "st1"))) == 0
+
+
+def test_shift_index_rank_scores_match_cosine_similarity():
+    shift_index = build_shift_index(make_shift_df())
+    values = ("sp1", "ce9", "c1", "st1")
+    rows, scores = shift_index.rank(values, depth=10)
+    expected = (
+        (shift_index.matrix @ shift_index.vectorizer.transform([values]).T)
+        .toarray()
+        .ravel()
+    )
+    assert rows.tolist() == [0, 3, 1, 2]
+    assert np.allclose(scores, expected[rows])
+
+
+def test_shift_index_skips_shifts_outside_the_upcoming_window():
+    shift_df = make_shift_df()
+    shift_df["date"] = [
+        TODAY + timedelta(days=5),
+        TODAY - timedelta(days=1),
+        None,
+        TODAY,
+    ]
+    shift_index = build_shift_index(shift_df)
+    values = ("sp1", "ce1", "c1", "st1")
+
+    # Test case 1: rows are ordered by date with undated shifts last
+    assert shift_index.ids.tolist() == ["s2", "s4", "s1", "s3"]
+
+    # Test case 2: expired shifts are never scored, undated ones always are
+    assert shift_index.ids[shift_index.search(values)].tolist() == ["s4", "s1", "s3"]
+
+    # Test case 3: the window excludes its end date
+    rows = shift_index.search(values, start=TODAY, end=TODAY + timedelta(days=5))
+    assert shift_index.ids[rows].tolist() == ["s4", "s3"]
+
+    # Test case 4: the long-term filter applies before scoring
+    rows = shift_index.search(("sp2", "ce1", "c1", "st1"), long_term=True)
+    assert shift_index.ids[rows].tolist() == []
+    rows = shift_index.search(values, start=TODAY - timedelta(days=1), long_term=True)
+    assert shift_index.ids[rows].tolist() == ["s2"]
+
+    # Test case 5: batches use the same window
+    window = {"start": TODAY, "end": TODAY + timedelta(days=5)}
+    batch = shift_index.search_batch([values], **window)
+    assert batch[0].tolist() == shift_index.search(values, **window).tolist()
+
+
+def test_build_temp_store():
+    temp_df = pd.DataFrame(
+        {
+            "tempid": ["t1", "t2", "t3"],
+            "attendance_score": [0, 50, 100],
+            "on_time_rate": [10, 20, 30],
+        }
+    )
+    temp_store = build_temp_store(temp_df)
+    assert len(temp_store) == 3
+    assert temp_store.matrix.min() == 0.0
+    assert temp_store.matrix.max() == 1.0
+    assert temp_store.scaler.transform([[50, 20]]).tolist() == [[0.5, 0.5]]
+
+
+def test_shift_index_search_batch_matches_search():
+    shift_index = build_shift_index(make_shift_df())
+    values_list = [
+        ("sp1", "ce1", "c1", "st1"),
+        ("sp2", "ce1", "c1", "st1"),
+        ("sp1", "ce2", "c2", "st2"),
+        ("x", "y", "z", "w"),
+    ]
+    results = shift_index.search_batch(values_list, k=3)
+    assert len(results) == len(values_list)
+    for values, rows in zip(values_list, results):
+        assert rows.tolist() == shift_index.search(values, k=3).tolist()
+
+
+def test_fetch_columns_streams_in_chunks():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with Session(engine) as db:
+        db.add_all(
+            TempData(tempid=f"t{i}", attendance_score=i, on_time_rate=None)
+            for i in range(25)
+        )
+        db.commit()
+        columns = fetch_columns(db, TEMP_COLUMNS, chunksize=10)
+    assert columns["tempid"].tolist() == [f"t{i}" for i in range(25)]
+    assert columns["attendance_score"].dtype == float
+    assert columns["on_time_rate"].shape == (25,)
+
+
+def test_table_version_changes_on_insert_update_and_delete():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with Session(engine) as db:
+        db.add_all(TempData(tempid=f"t{i}", attendance_score=i) for i in range(3))
+        db.commit()
+        versions = [fetch_table_version(db, TempData)]
+        # Test case 1: the token is stable while the table is unchanged
+        assert fetch_table_version(db, TempData) == versions[0]
+
+        # Test case 2: inserts, in-place updates and deletes each change it
+        db.add(TempData(tempid="t3", attendance_score=3))
+        db.commit()
+        versions.append(fetch_table_version(db, TempData))
+        db.get(TempData, "t1").attendance_score = 90
+        db.commit()
+        versions.append(fetch_table_version(db, TempData))
+        db.delete(db.get(TempData, "t0"))
+        db.commit()
+        versions.append(fetch_table_version(db, TempData))
+    assert len(set(versions)) == 4
+
+
+def test_read_copy_csv_types_columns_like_the_streamed_path():
+    # COPY ... TO STDOUT WITH (FORMAT csv, NULL '\N') output of shifts_table
+    buffer = io.BytesIO(
+        b'a,sp1,ce1,"c,1",st1,2030-01-02,t\n'
+        b"b,,\\N,c2,st2,\\N,f\n"
+        b"c,sp3,ce3,c3,st3,2030-01-01,\\N\n"
+    )
+    columns = read_copy_csv(buffer, SHIFT_COLUMNS, chunksize=2)
+    assert columns["id"].tolist() == ["a", "b", "c"]
+    # Test case 1: NULL and empty strings stay distinct, quoting is undone
+    assert columns["speciality"].tolist() == ["sp1", "", "sp3"]
+    assert columns["certification"].tolist() == ["ce1", None, "ce3"]
+    assert columns["city"].tolist() == ["c,1", "c2", "c3"]
+    # Test case 2: dates and booleans get the dtypes the indexes expect
+    assert columns["date"].dtype == np.dtype("datetime64[D]")
+    assert np.isnat(columns["date"][1])
+    assert columns["is_long_term"].tolist() == [True, False, False]
+    # Test case 3: no rows yields typed empty arrays
+    empty = read_copy_csv(io.BytesIO(b""), TEMP_COLUMNS)
+    assert empty["attendance_score"].dtype == float
@@ -0,0 +1,29 @@
+import logging
+
+from .. import logger as app_logger
+
+
+def test_setup_logging_installs_handlers_once():
+    logger = app_logger.setup_logging()
+    assert app_logger.setup_logging() is logger
+    queue_handlers = [
+        handler
+        for handler in logger.handlers
+        if isinstance(handler, app_logger.BackgroundQueueHandler)
+    ]
+    assert len(queue_handlers) == 1
+
+
+def test_log_payload_sampling(monkeypatch):
+    logger = logging.getLogger("test_log_payload_sampling")
+    logger.setLevel(logging.INFO)
+    records = []
+    monkeypatch.setattr(logger, "info", lambda *args, **kwargs: records.append(args))
+
+    monkeypatch.setattr(app_logger, "LOG_PAYLOAD_SAMPLE_RATE", 0.0)
+    app_logger.log_payload(logger, "payload %s", {"data": 1})
+    assert records == []
+
+    monkeypatch.setattr(app_logger, "LOG_PAYLOAD_SAMPLE_RATE", 1.0)
+    app_logger.log_payload(logger, "payload %s", {"data": 1})
+    assert records == [("payload %s", {"data": 1})]
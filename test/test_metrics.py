@@ -0,0 +1,36 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from .. import metrics
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = metrics.Histogram("test_seconds", "Test.", ["stage"], buckets=(0.1, 1))
+    histogram.observe(0.05, stage="a")
+    histogram.observe(0.5, stage="a")
+    histogram.observe(5, stage="a")
+    rendered = histogram.render()
+    assert 'test_seconds_bucket{stage="a",le="0.1"} 1' in rendered
+    assert 'test_seconds_bucket{stage="a",le="1"} 2' in rendered
+    assert 'test_seconds_bucket{stage="a",le="+Inf"} 3' in rendered
+    assert 'test_seconds_count{stage="a"} 3' in rendered
+
+
+def test_middleware_adds_server_timing_and_records_route():
+    app = FastAPI()
+    app.add_middleware(metrics.MetricsMiddleware)
+
+    @app.get("/items/{item_id}")
+    def get_item(item_id: int):
+        with metrics.stage("score"):
+            return {"item_id": item_id}
+
+    response = TestClient(app).get("/items/1")
+    assert response.status_code == 200
+    server_timing = response.headers["server-timing"]
+    assert "score;dur=" in server_timing
+    assert "total;dur=" in server_timing
+    assert (
+        'http_request_duration_seconds_count{route="/items/{item_id}",status="200"}'
+        in metrics.registry.render()
+    )
@@ -0,0 +1,59 @@
+import pytest
+from fastapi import HTTPException
+
+from ..routers.v1.crud import pagination
+from ..routers.v1.crud.pagination import (
+    decode_cursor,
+    encode_cursor,
+    ranked_page,
+    ranking_cache,
+)
+from ..routers.v1.schemas import MAX_PAGE_SIZE
+
+
+# Test case 1: cursors round-trip and expire with the ranking version
+def test_cursor_round_trip_and_expiry():
+    cursor = encode_cursor(10, (3,))
+    assert decode_cursor(cursor, (3,)) == 10
+    assert decode_cursor(None, (3,)) == 0
+    with pytest.raises(HTTPException):
+        decode_cursor(cursor, (4,))
+    with pytest.raises(HTTPException):
+        decode_cursor("not a cursor", (3,))
+
+
+# Test case 2: later pages are sliced from the cached ranking
+def test_ranked_page_reuses_cached_ranking(monkeypatch):
+    monkeypatch.setattr(pagination, "RANKING_PREFETCH_PAGES", 1)
+    ranking_cache.clear()
+    ranking = list(range(300))
+    depths = []
+
+    def rank(depth):
+        depths.append(depth)
+        return ranking[:depth], [1.0 / (i + 1) for i in ranking[:depth]]
+
+    # the first request ranks a full page of the largest size deep
+    rows, scores, next_offset = ranked_page("query", rank, 0, 5)
+    assert rows == [0, 1, 2, 3, 4]
+    assert next_offset == 5
+    assert depths == [MAX_PAGE_SIZE + 1]
+
+    # so the next page is a cache hit
+    rows, _, next_offset = ranked_page("query", rank, 5, 5)
+    assert rows == [5, 6, 7, 8, 9]
+    assert depths == [MAX_PAGE_SIZE + 1]
+
+    # deeper pages rank again with at least twice the depth
+    rows, _, next_offset = ranked_page("query", rank, MAX_PAGE_SIZE, 5)
+    assert rows == list(range(MAX_PAGE_SIZE, MAX_PAGE_SIZE + 5))
+    assert depths == [MAX_PAGE_SIZE + 1, 2 * MAX_PAGE_SIZE + 2]
+    rows, _, next_offset = ranked_page("query", rank, 295, 5)
+    assert rows == [295, 296, 297, 298, 299]
+    assert next_offset is None
+    assert depths == [MAX_PAGE_SIZE + 1, 2 * MAX_PAGE_SIZE + 2, 4 * MAX_PAGE_SIZE + 4]
+
+    # a ranking shorter than its depth is complete and always reused
+    rows, _, _ = ranked_page("query", rank, 290, 5)
+    assert rows == [290, 291, 292, 293, 294]
+    assert len(depths) == 3
@@ -0,0 +1,52 @@
+from types import SimpleNamespace
+
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from ..routers.v1.crud.response_cache import cached_response, response_cache
+
+
+# Test case 1: repeat queries are served from the cache and revalidated with 304
+def test_cached_response_etag_and_not_modified():
+    response_cache.clear()
+    holder = SimpleNamespace(version=(1,))
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        return {"data": {"shift": ["a", "b"]}}
+
+    app = FastAPI()
+
+    @app.get("/shifts")
+    async def shifts(request: Request, city: str):
+        return await cached_response(
+            request,
+            "shifts",
+            {"city": city},
+            holder,
+            compute,
+        )
+
+    client = TestClient(app)
+    first = client.get("/shifts", params={"city": "x"})
+    assert first.status_code == 200
+    assert first.json() == {"data": {"shift": ["a", "b"]}}
+    etag = first.headers["etag"]
+
+    second = client.get("/shifts", params={"city": "x"})
+    assert second.json() == first.json()
+    assert second.headers["etag"] == etag
+    assert len(calls) == 1
+
+    not_modified = client.get(
+        "/shifts", params={"city": "x"}, headers={"If-None-Match": etag}
+    )
+    assert not_modified.status_code == 304
+
+    # a new data version changes the tag and recomputes the response
+    holder.version = (2,)
+    stale = client.get("/shifts", params={"city": "x"}, headers={"If-None-Match": etag})
+    assert stale.status_code == 200
+    assert stale.headers["etag"] != etag
+    assert len(calls) == 2
@@ -0,0 +1,271 @@
+from datetime import date, timedelta
+from pathlib import Path
+
+from sqlalchemy import select, text
+
+from ..models import ShiftData, TempData, TempSegment
+from ..routers.v1.crud.pagination import encode_cursor
+from ..routers.v1.schemas import MAX_BATCH_SIZE, MAX_SHIFT_WINDOW_DAYS
+
+MIGRATION = Path(__file__).parents[1] / "migrations" / "001_create_temp_segments.sql"
+
+
+def get_page(api, path, **params):
+    response = api["client"].get(
+        path, params=dict(api["shift"], **params), headers=api["headers"]
+    )
+    assert response.status_code == 200
+    return response.json()["data"]
+
+
+# Test case 1: a recommend-temp round trip over the async SQLite session
+def test_recommend_temp_round_trip(api):
+    response = api["client"].get(
+        "/v1/recommend-temp", params=api["shift"], headers=api["headers"]
+    )
+    assert response.status_code == 200
+    data = response.json()["data"]
+    assert set(data["temps"]) == {
+        "Health Care supporter",
+        "Care Specialist",
+        "Patient Advocate",
+        "Clinical Excellence",
+        "Elite Care Partner",
+    }
+    assert all(len(tempids) == 5 for tempids in data["temps"].values())
+
+
+# Test case 2: a recommend-shifts round trip ranks the queried shift's match
+# first, and every database slot taken on the way was given back
+def test_recommend_shifts_round_trip(api):
+    response = api["client"].get(
+        "/v1/recommend-shifts", params=api["shift"], headers=api["headers"]
+    )
+    assert response.status_code == 200
+    data = response.json()["data"]
+    assert 0 < len(data["shift"]) <= 5
+    assert data["scores"][0] == max(data["scores"])
+    assert api["admission"].active == 0
+    assert api["client"].get("/ready").status_code == 200
+
+
+# Test case 3: requests without a bearer token are rejected
+def test_recommend_requires_token(api):
+    response = api["client"].get(
+        "/v1/recommend-shifts",
+        params=api["shift"],
+        headers={"authorization": "Basic nope"},
+    )
+    assert response.status_code == 401
+
+
+# Test case 4: each batch item splices the query next to the rankings the
+# single-query route serves for it
+def test_temp_batch_matches_single_queries(api):
+    other = dict(api["shift"], city=api["values"]["city"][0])
+    response = api["client"].post(
+        "/v1/recommend-temp/batch",
+        json={"queries": [api["shift"], other, api["shift"]]},
+        headers=api["headers"],
+    )
+    assert response.status_code == 200
+    body = response.json()
+    assert [item["query"] for item in body["data"]] == [
+        api["shift"],
+        other,
+        api["shift"],
+    ]
+    single = api["client"].get(
+        "/v1/recommend-temp", params=api["shift"], headers=api["headers"]
+    )
+    assert body["data"][0]["temps"] == single.json()["data"]["temps"]
+    assert body["computed_at"] == single.json()["data"]["computed_at"]
+
+
+# Test case 5: shift batches answer every query with its top shifts
+def test_shift_batch_response_shape(api):
+    queries = [api["shift"], dict(api["shift"], state=api["values"]["state"][0])]
+    response = api["client"].post(
+        "/v1/recommend-shifts/batch", json={"queries": queries}, headers=api["headers"]
+    )
+    assert response.status_code == 200
+    data = response.json()["data"]
+    assert [item["query"] for item in data] == queries
+    single = api["client"].get(
+        "/v1/recommend-shifts", params=api["shift"], headers=api["headers"]
+    )
+    assert data[0]["shift"] == single.json()["data"]["shift"]
+    assert all(len(item["shift"]) <= 5 for item in data)
+
+
+# Test case 6: empty, oversized and malformed batches are rejected by the
+# request model
+def test_batch_request_limits(api):
+    for queries in (
+        [],
+        [api["shift"]] * (MAX_BATCH_SIZE + 1),
+        [dict(api["shift"], city="short")],
+    ):
+        for path in ("/v1/recommend-temp/batch", "/v1/recommend-shifts/batch"):
+            response = api["client"].post(
+                path, json={"queries": queries}, headers=api["headers"]
+            )
+            assert response.status_code == 422
+
+
+# Test case 7: the next_cursor of a page fetches the following page
+def test_next_cursor_fetches_the_following_page(api):
+    for path, key in (
+        ("/v1/recommend-shifts", "shift"),
+        ("/v1/recommend-temp", "temps"),
+    ):
+        whole = get_page(api, path, limit=4)
+        first = get_page(api, path, limit=2)
+        assert first["next_cursor"] is not None
+        second = get_page(api, path, limit=2, cursor=first["next_cursor"])
+        if key == "shift":
+            assert first["shift"] + second["shift"] == whole["shift"]
+            assert first["scores"] + second["scores"] == whole["scores"]
+        else:
+            for badge, tempids in whole["temps"].items():
+                assert first["temps"][badge] + second["temps"][badge] == tempids
+
+
+# Test case 8: garbage cursors and cursors of another ranking get a 400
+def test_invalid_and_stale_cursors_are_rejected(api):
+    for path in ("/v1/recommend-shifts", "/v1/recommend-temp"):
+        for cursor in ("not a cursor", encode_cursor(2, ("stale",))):
+            response = api["client"].get(
+                path,
+                params=dict(api["shift"], limit=2, cursor=cursor),
+                headers=api["headers"],
+            )
+            assert response.status_code == 400
+
+
+# Test case 9: within_days and is_long_term filter the shifts the route ranks
+def test_shift_window_and_long_term_filters(api):
+    shifts = {}
+    with api["main"].SessionLocal() as db:
+        for shift in db.scalars(select(ShiftData)):
+            shifts[shift.id] = shift
+    today = date.today()
+
+    # a window just long enough to hold the queried shift
+    within_days = (
+        min(
+            shift.date
+            for shift in shifts.values()
+            if shift.date >= today
+            and (shift.city, shift.state, shift.speciality, shift.certification)
+            == tuple(api["shift"].values())
+        )
+        - today
+    ).days + 1
+    window = get_page(api, "/v1/recommend-shifts", limit=100, within_days=within_days)
+    assert window["shift"]
+    assert all(
+        today <= shifts[shift_id].date < today + timedelta(days=within_days)
+        for shift_id in window["shift"]
+    )
+    for is_long_term in (True, False):
+        page = get_page(
+            api, "/v1/recommend-shifts", limit=100, is_long_term=is_long_term
+        )
+        assert page["shift"]
+        assert all(
+            shifts[shift_id].is_long_term is is_long_term for shift_id in page["shift"]
+        )
+
+    # windows outside 1-365 days are rejected
+    for within_days in (0, MAX_SHIFT_WINDOW_DAYS + 1):
+        response = api["client"].get(
+            "/v1/recommend-shifts",
+            params=dict(api["shift"], within_days=within_days),
+            headers=api["headers"],
+        )
+        assert response.status_code == 422
+
+
+# Test case 10: batches that cannot get a database slot to build a cold index
+# are shed with the admission 503 and its Retry-After, not a 500
+def test_batch_routes_shed_with_503(api, monkeypatch):
+    main = api["main"]
+    monkeypatch.setattr(api["admission"], "limit", 0)
+    monkeypatch.setattr(api["admission"], "queue_size", 0)
+    for holder in (main.temp_segment_holder, main.shift_index_holder):
+        monkeypatch.setattr(holder, "_current", None)
+    for path in ("/v1/recommend-temp/batch", "/v1/recommend-shifts/batch"):
+        response = api["client"].post(
+            path, json={"queries": [api["shift"]]}, headers=api["headers"]
+        )
+        assert response.status_code == 503
+        assert response.headers["retry-after"] == "1"
+
+
+# Test case 11: once the migration creates temp_segments and temps are
+# assigned to segments, recommend-temp ranks only the queried segment's temps
+# and 404s for a segment without any; a missing table serves the global
+# rankings
+def test_recommend_temp_scoped_by_segment(api):
+    main = api["main"]
+    other = dict(api["shift"], city=api["values"]["city"][0])
+
+    def refresh():
+        with main.SessionLocal() as db:
+            main.temp_segment_holder.refresh(db)
+
+    def get(params):
+        return api["client"].get(
+            "/v1/recommend-temp", params=params, headers=api["headers"]
+        )
+
+    with main.SessionLocal() as db:
+        db.execute(text("DROP TABLE temp_segments"))
+        db.commit()
+        members = db.scalars(select(TempData.tempid).limit(3)).all()
+    try:
+        refresh()
+        response = get(other)
+        assert response.status_code == 200
+        assert all(
+            len(temps) == 5 for temps in response.json()["data"]["temps"].values()
+        )
+
+        with main.SessionLocal() as db:
+            db.connection().connection.executescript(MIGRATION.read_text())
+            db.add_all(
+                TempSegment(
+                    tempid=tempid,
+                    city=api["shift"]["city"],
+                    state=api["shift"]["state"],
+                    speciality=api["shift"]["speciality"],
+                    certification=api["shift"]["certificate"],
+                )
+                for tempid in members
+            )
+            db.commit()
+        refresh()
+        response = get(api["shift"])
+        assert response.status_code == 200
+        for temps in response.json()["data"]["temps"].values():
+            assert sorted(temps) == sorted(members)
+        assert get(other).status_code == 404
+
+        # batches give a segment without temps empty rankings
+        response = api["client"].post(
+            "/v1/recommend-temp/batch",
+            json={"queries": [api["shift"], other]},
+            headers=api["headers"],
+        )
+        assert response.status_code == 200
+        scoped, empty = response.json()["data"]
+        assert all(
+            sorted(temps) == sorted(members) for temps in scoped["temps"].values()
+        )
+        assert not any(empty["temps"].values())
+    finally:
+        with main.SessionLocal() as db:
+            db.execute(text("DELETE FROM temp_segments"))
+            db.commit()
+        refresh()
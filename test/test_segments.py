@@ -0,0 +1,99 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pandas as pd
+import pytest
+from fastapi import HTTPException
+
+from ..routers.v1.crud.pagination import decode_cursor
+from ..routers.v1.crud.segments import (
+    build_segment_index,
+    segment_cache,
+    segment_recommendations,
+)
+from ..routers.v1.crud.temp_store import build_temp_store
+
+BADGES = [("Care Specialist", 0, 0), ("Elite Care Partner", 90, 90)]
+COMPUTED_AT = datetime(2030, 1, 1, tzinfo=timezone.utc)
+NORTH = ("c1", "st1", "sp1", "ce1")
+SOUTH = ("c2", "st2", "sp1", "ce1")
+
+
+def make_inputs(segment_rows, temp_store_version=(10,)):
+    temp_store = build_temp_store(
+        pd.DataFrame(
+            {
+                "tempid": [f"t{i}" for i in range(10)],
+                "attendance_score": [i * 10 for i in range(10)],
+                "on_time_rate": [i * 10 for i in range(10)],
+            }
+        )
+    )
+    columns = {
+        column: [row[i] for row in segment_rows]
+        for i, column in enumerate(
+            ["tempid", "city", "state", "speciality", "certification"]
+        )
+    }
+    return temp_store_version, temp_store, BADGES, COMPUTED_AT, columns
+
+
+def test_segment_index_ranks_only_the_members_of_a_segment():
+    segment_index = build_segment_index(
+        make_inputs(
+            [("t1", *NORTH), ("t8", *NORTH), ("t9", *SOUTH), ("t0", *SOUTH)]
+            # segments of temps missing from csv_data are dropped
+            + [("gone", "c3", "st3", "sp3", "ce3")]
+        )
+    )
+    assert len(segment_index) == 2
+
+    # Test case 1: each segment ranks its own temps for every badge
+    north = asyncio.run(segment_recommendations(segment_index, NORTH))
+    assert north.temps == {
+        "Care Specialist": ["t1", "t8"],
+        "Elite Care Partner": ["t8", "t1"],
+    }
+    south = asyncio.run(segment_recommendations(segment_index, SOUTH))
+    assert south.temps["Elite Care Partner"] == ["t9", "t0"]
+
+    # Test case 2: a segment without temps has no rankings
+    assert asyncio.run(segment_recommendations(segment_index, ("x",) * 4)) is None
+
+
+def test_segment_rankings_are_reused_until_their_members_change():
+    segment_cache.clear()
+    rows = [("t1", *NORTH), ("t8", *NORTH), ("t9", *SOUTH)]
+    segment_index = build_segment_index(make_inputs(rows))
+    north = asyncio.run(segment_recommendations(segment_index, NORTH))
+    south = asyncio.run(segment_recommendations(segment_index, SOUTH))
+
+    # Test case 1: regrouping keeps the rankings of unchanged segments
+    regrouped = build_segment_index(make_inputs(rows + [("t2", *SOUTH)]))
+    assert asyncio.run(segment_recommendations(regrouped, NORTH)) is north
+    assert asyncio.run(segment_recommendations(regrouped, SOUTH)) is not south
+
+    # Test case 2: a rebuilt temp store re-ranks every segment
+    rebuilt = build_segment_index(make_inputs(rows, temp_store_version=(11,)))
+    assert asyncio.run(segment_recommendations(rebuilt, NORTH)) is not north
+
+
+def test_segment_cursors_survive_re_ranking_after_eviction():
+    segment_cache.clear()
+    rows = [(f"t{i}", *NORTH) for i in range(8)]
+    segment_index = build_segment_index(make_inputs(rows))
+    first = asyncio.run(segment_recommendations(segment_index, NORTH)).page(0, 5)
+
+    # Test case 1: a segment re-ranked with unchanged data pages the same way
+    segment_cache.clear()
+    again = asyncio.run(segment_recommendations(segment_index, NORTH))
+    assert again.page(0, 5) == first
+    assert again.computed_at == COMPUTED_AT
+    cursor = first["data"]["next_cursor"]
+    assert decode_cursor(cursor, again.version) == 5
+
+    # Test case 2: cursors expire once the segment's members change
+    regrouped = build_segment_index(make_inputs(rows + [("t9", *NORTH)]))
+    changed = asyncio.run(segment_recommendations(regrouped, NORTH))
+    with pytest.raises(HTTPException):
+        decode_cursor(cursor, changed.version)
@@ -0,0 +1,44 @@
+from datetime import date, timedelta
+
+import numpy as np
+
+from ..routers.v1.crud.sharded import ShardedShiftScorer
+from ..routers.v1.crud.shift_index import build_shift_index
+
+
+def make_shift_columns(size, seed=0):
+    rng = np.random.default_rng(seed)
+    today = date.today()
+    return {
+        "id": [f"s{i}" for i in range(size)],
+        "speciality": rng.choice(["sp1", "sp2", "sp3"], size),
+        "certification": rng.choice(["ce1", "ce2"], size),
+        "city": rng.choice(["c1", "c2", "c3", "c4"], size),
+        "state": rng.choice(["st1", "st2"], size),
+        "date": [
+            today + timedelta(days=int(day)) for day in rng.integers(-5, 20, size)
+        ],
+        "is_long_term": rng.random(size) < 0.2,
+    }
+
+
+# Test case 1: the merged per-shard top-k equals the unsharded ranking, ties
+# included, for every live window
+def test_sharded_scorer_matches_search_batch():
+    shift_index = build_shift_index(make_shift_columns(500))
+    values_list = [
+        ("sp1", "ce1", "c1", "st1"),
+        ("sp2", "ce2", "c3", "st2"),
+        ("sp3", "ce9", "c9", "st1"),
+        ("x", "y", "z", "w"),
+    ]
+    scorer = ShardedShiftScorer(3)
+    try:
+        for end in (None, date.today() + timedelta(days=7)):
+            expected = shift_index.search_batch(values_list, k=20, end=end)
+            results = scorer.search_batch(shift_index, values_list, k=20, end=end)
+            assert [rows.tolist() for rows in results] == [
+                rows.tolist() for rows in expected
+            ]
+    finally:
+        scorer.shutdown()
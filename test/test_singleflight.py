@@ -0,0 +1,81 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from ..routers.v1.crud.singleflight import SingleFlight
+
+
+# Test case 1: concurrent callers with one key share a single computation
+def test_single_flight_coalesces_identical_calls():
+    flight = SingleFlight("test")
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return len(calls)
+
+    async def run():
+        first = await asyncio.gather(*(flight.do("key", compute) for _ in range(10)))
+        # a finished computation is not reused by later calls
+        second = await flight.do("key", compute)
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first == [1] * 10
+    assert second == 2
+    assert len(flight) == 0
+
+
+# Test case 2: followers get the leader's exception or a 503 once they time out
+def test_single_flight_shares_errors_and_times_out():
+    flight = SingleFlight("test")
+    impatient_flight = SingleFlight("test", timeout=0.01)
+
+    async def fail():
+        await asyncio.sleep(0.005)
+        raise ValueError("boom")
+
+    async def slow():
+        await asyncio.sleep(0.2)
+        return "done"
+
+    async def run():
+        failures = await asyncio.gather(
+            flight.do("fail", fail), flight.do("fail", fail), return_exceptions=True
+        )
+        results = await asyncio.gather(
+            impatient_flight.do("slow", slow),
+            impatient_flight.do("slow", slow),
+            return_exceptions=True,
+        )
+        return failures, results
+
+    failures, results = asyncio.run(run())
+    assert [type(error) for error in failures] == [ValueError, ValueError]
+    assert results[0] == "done"
+    assert isinstance(results[1], HTTPException)
+    assert results[1].status_code == 503
+    assert results[1].headers["Retry-After"] == "1"
+
+
+# Test case 3: followers of a cancelled leader run the computation themselves
+def test_single_flight_recovers_from_cancelled_leader():
+    flight = SingleFlight("test")
+
+    async def compute():
+        await asyncio.sleep(0.01)
+        return "done"
+
+    async def run():
+        leader = asyncio.ensure_future(flight.do("key", compute))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flight.do("key", compute))
+        await asyncio.sleep(0)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower
+
+    assert asyncio.run(run()) == "done"
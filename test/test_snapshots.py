@@ -0,0 +1,155 @@
+import os
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from ..benchmarks.recommenders import seed_database
+from ..build_indexes import (
+    HOLDERS,
+    SnapshotVerificationError,
+    build_snapshot,
+    verify_snapshot,
+)
+from ..routers.v1.crud import snapshots
+from ..routers.v1.crud.indexing import IndexHolder
+from ..routers.v1.crud.shift_index import (
+    build_shift_index,
+    load_shift_index,
+    save_shift_index,
+)
+from ..routers.v1.crud.temp_store import (
+    build_temp_store,
+    load_temp_store,
+    save_temp_store,
+)
+
+TODAY = date.today()
+
+
+def make_shift_df():
+    return pd.DataFrame(
+        {
+            "id": ["s1", "s2", "s3", "s4"],
+            "city": ["c1", "c1", "c2", "c1"],
+            "state": ["st1", "st1", "st2", "st1"],
+            "speciality": ["sp1", "sp2", "sp1", "sp1"],
+            "certification": ["ce1", "ce1", "ce2", "ce1"],
+            "date": [TODAY + timedelta(days=day) for day in range(4)],
+            "is_long_term": [False, True, False, False],
+        }
+    )
+
+
+# Test case 1: a shift index snapshot is memory-mapped and searches the same
+def test_shift_index_snapshot_round_trip(tmp_path):
+    shift_index = build_shift_index(make_shift_df())
+    save_shift_index(shift_index, str(tmp_path))
+    loaded = load_shift_index(str(tmp_path))
+    # read-only views of the mapped files rather than private copies
+    assert not loaded.matrix.data.flags.writeable
+    assert not loaded.postings.indices.flags.writeable
+    for values in [("sp1", "ce1", "c1", "st1"), ("sp2", "ce2", "c2", "st9")]:
+        assert loaded.ids[loaded.search(values)].tolist() == (
+            shift_index.ids[shift_index.search(values)].tolist()
+        )
+
+
+# Test case 2: a temp store snapshot keeps the matrix and the fitted scaler
+def test_temp_store_snapshot_round_trip(tmp_path):
+    temp_store = build_temp_store(
+        {
+            "tempid": np.array(["t1", "t2", "t3"], dtype=object),
+            "attendance_score": np.array([0.0, 50.0, 100.0]),
+            "on_time_rate": np.array([10.0, 20.0, 30.0]),
+        }
+    )
+    save_temp_store(temp_store, str(tmp_path))
+    loaded = load_temp_store(str(tmp_path))
+    assert isinstance(loaded.matrix, np.memmap)
+    assert loaded.tempids.tolist() == ["t1", "t2", "t3"]
+    assert loaded.scaler.transform([[50, 20]]).tolist() == [[0.5, 0.5]]
+
+
+# Test case 3: a holder loaded from a snapshot keeps it while the version holds
+def test_index_holder_snapshot_survives_refresh(tmp_path):
+    builds = []
+
+    def make_holder():
+        return IndexHolder(
+            "test index",
+            loader=lambda db: [1, 2],
+            builder=lambda rows: builds.append(rows)
+            or build_shift_index(make_shift_df()),
+            versioner=lambda db: (4, (1, 2)),
+            saver=save_shift_index,
+            opener=load_shift_index,
+        )
+
+    holder = make_holder()
+    holder.refresh(None)
+    holder.save_snapshot(str(tmp_path))
+
+    worker_holder = make_holder()
+    worker_holder.load_snapshot(str(tmp_path))
+    assert worker_holder.version == (4, (1, 2))
+    worker_holder.refresh(None)
+    assert len(builds) == 1
+
+
+# Test case 4: after a table change, refresh maps a snapshot published at the
+# new version instead of building a private copy
+def test_index_holder_refreshes_from_matching_snapshot(tmp_path):
+    builds = []
+    state = {"version": (1,)}
+
+    def make_holder():
+        return IndexHolder(
+            "test index",
+            loader=lambda db: [1, 2],
+            builder=lambda rows: builds.append(rows)
+            or build_shift_index(make_shift_df()),
+            versioner=lambda db: state["version"],
+            saver=save_shift_index,
+            opener=load_shift_index,
+        )
+
+    worker_holder = make_holder()
+    worker_holder.refresh(None)
+    state["version"] = (2,)
+    publisher = make_holder()
+    publisher.refresh(None)
+    publisher.save_snapshot(str(tmp_path))
+    assert len(builds) == 2
+
+    worker_holder.refresh(None, snapshot=str(tmp_path))
+    assert worker_holder.version == (2,)
+    assert isinstance(worker_holder.current[1].ids, np.memmap)
+    assert len(builds) == 2
+
+    # a snapshot behind the tables is ignored and the index is rebuilt
+    state["version"] = (3,)
+    worker_holder.refresh(None, snapshot=str(tmp_path))
+    assert worker_holder.version == (3,)
+    assert len(builds) == 3
+
+
+# Test case 5: the CLI publishes verified snapshots and catches corrupt files
+def test_build_snapshot_publishes_verified_snapshot(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'build.db'}")
+    seed_database(engine, 200)
+    root = str(tmp_path / "snapshots")
+
+    build_snapshot(sessionmaker(bind=engine), HOLDERS, root, keep=1)
+    path = build_snapshot(sessionmaker(bind=engine), HOLDERS, root, keep=1)
+    assert snapshots.list_snapshots(root) == [path]
+    assert snapshots.latest_snapshot(root) == path
+    manifest = snapshots.read_manifest(path)
+    assert manifest["indexes"] == {holder.name: holder.version for holder in HOLDERS}
+
+    np.save(os.path.join(path, "temp", "matrix.npy"), np.zeros((200, 2)))
+    with pytest.raises(SnapshotVerificationError):
+        verify_snapshot(path, HOLDERS)
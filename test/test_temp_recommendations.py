@@ -0,0 +1,112 @@
+import json
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi import HTTPException
+
+from ..routers.v1 import schemas
+from ..routers.v1.crud.knn import METRICS, TREE_METRICS, KNNIndex
+from ..routers.v1.crud.materialized import (
+    build_temp_recommendations,
+    load_temp_recommendations,
+    save_temp_recommendations,
+)
+from ..routers.v1.crud.pagination import decode_cursor
+from ..routers.v1.crud.temp_store import build_temp_store, recommend_temps
+
+
+def make_temp_store():
+    temp_df = pd.DataFrame(
+        {
+            "tempid": [f"t{i}" for i in range(10)],
+            "attendance_score": [i * 10 for i in range(10)],
+            "on_time_rate": [i * 10 for i in range(10)],
+        }
+    )
+    return build_temp_store(temp_df)
+
+
+def test_recommend_temps_orders_by_distance():
+    temp_store = make_temp_store()
+    input_data = {"attendance_score": 90, "on_time_rate": 90}
+    assert recommend_temps(input_data, temp_store, metric="euclidean") == [
+        "t9",
+        "t8",
+        "t7",
+        "t6",
+        "t5",
+    ]
+
+
+def test_build_temp_recommendations():
+    badges = [("Care Specialist", 0, 0), ("Elite Care Partner", 90, 90)]
+    recommendations = build_temp_recommendations((make_temp_store(), badges))
+    assert set(recommendations.temps) == {"Care Specialist", "Elite Care Partner"}
+    assert recommendations.temps["Care Specialist"][0] == "t0"
+    assert recommendations.temps["Elite Care Partner"][0] == "t9"
+    assert recommendations.computed_at is not None
+    assert recommendations.distances["Care Specialist"] == sorted(
+        recommendations.distances["Care Specialist"]
+    )
+
+
+def test_temp_recommendation_cursors_follow_the_data(tmp_path):
+    badges = [("Care Specialist", 0, 0), ("Elite Care Partner", 90, 90)]
+    recommendations = build_temp_recommendations((make_temp_store(), badges))
+    cursor = recommendations.page(0, 5)["data"]["next_cursor"]
+
+    # Test case 1: rankings of the same data, computed at another time or
+    # read back from a snapshot, accept the same cursors
+    rebuilt = build_temp_recommendations(
+        (make_temp_store(), badges), computed_at=datetime(2030, 1, 1)
+    )
+    save_temp_recommendations(recommendations, str(tmp_path))
+    for other in (rebuilt, load_temp_recommendations(str(tmp_path))):
+        assert decode_cursor(cursor, other.version) == 5
+
+    # Test case 2: changed rankings expire them
+    changed = build_temp_recommendations((make_temp_store(), badges[:1]))
+    with pytest.raises(HTTPException):
+        decode_cursor(cursor, changed.version)
+
+
+def test_materialized_body_matches_response_model():
+    badges = [
+        ("Health Care supporter", 20, 20),
+        ("Care Specialist", 40, 40),
+        ("Patient Advocate", 60, 60),
+        ("Clinical Excellence", 80, 80),
+        ("Elite Care Partner", 90, 90),
+    ]
+    recommendations = build_temp_recommendations((make_temp_store(), badges))
+    validated = schemas.TempRecommendations.model_validate(
+        recommendations.page(0, schemas.DEFAULT_PAGE_SIZE)
+    )
+    assert json.loads(recommendations.body) == json.loads(
+        validated.model_dump_json(by_alias=True)
+    )
+
+
+def test_knn_index_matches_full_sort_for_all_metrics():
+    rng = np.random.default_rng(0)
+    matrix = rng.random((500, 2))
+    points = rng.random((5, 2))
+    for metric in METRICS:
+        brute = KNNIndex(matrix, metric, tree_threshold=len(matrix) + 1)
+        indices, distances = brute.query(points, 5)
+        expected = np.sort(brute.distances(points), axis=1)[:, :5]
+        assert np.allclose(distances, expected)
+        assert indices.shape == (5, 5)
+        if metric in TREE_METRICS:
+            tree = KNNIndex(matrix, metric, tree_threshold=1)
+            assert tree.tree is not None
+            _, tree_distances = tree.query(points, 5)
+            assert np.allclose(tree_distances, expected)
+
+
+def test_knn_index_with_fewer_rows_than_k():
+    knn_index = KNNIndex(np.array([[0.0, 0.0], [1.0, 1.0]]), "euclidean")
+    indices, _ = knn_index.query(np.array([[1.0, 1.0]]), 5)
+    assert indices.tolist() == [[1, 0]]